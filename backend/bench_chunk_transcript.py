@@ -0,0 +1,55 @@
+import sys
+import random
+import time
+
+# Add current directory to path
+sys.path.insert(0, '.')
+
+from transcripts import chunk_transcript
+
+WORDS = ("the quick brown fox jumps over lazy dog lecture topic example "
+         "question answer model data result stream chat video part next").split()
+
+
+def synthetic_transcript(num_entries, seed=0):
+    """Caption-like entries: 2-4 s each, 3-12 words per line"""
+    rng = random.Random(seed)
+    entries = []
+    t = 0.0
+    for _ in range(num_entries):
+        duration = round(rng.uniform(2.0, 4.0), 2)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+        entries.append({"start": round(t, 2), "end": round(t + duration, 2), "text": text})
+        t += duration
+    return entries
+
+
+def check(cleaned, chunked):
+    """Every chunk must start and end on real entries, in order"""
+    starts = {entry["start"] for entry in cleaned}
+    ends = {entry["end"] for entry in cleaned}
+    previous_start = 0.0
+    for chunk in chunked:
+        assert chunk["start"] in starts, chunk
+        assert chunk["end"] in ends, chunk
+        assert chunk["start"] <= chunk["end"], chunk
+        assert chunk["start"] >= previous_start, chunk
+        previous_start = chunk["start"]
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000, 10_000, 50_000, 100_000]
+
+    print(f"{'entries':>8} {'hours':>6} {'chunks':>7} {'seconds':>8}")
+    for size in sizes:
+        cleaned = synthetic_transcript(size)
+        start = time.perf_counter()
+        chunked = chunk_transcript(cleaned, chunk_size=500, chunk_overlap=50)
+        elapsed = time.perf_counter() - start
+        check(cleaned, chunked)
+        hours = cleaned[-1]["end"] / 3600 if cleaned else 0
+        print(f"{size:8d} {hours:6.1f} {len(chunked):7d} {elapsed:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
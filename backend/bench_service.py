@@ -0,0 +1,367 @@
+"""Offline load test of the chapter, emotion and recommendation endpoints.
+
+    python bench_service.py --requests 200 --concurrency 16 --fake-model
+
+Runs the app in-process and replaces every external dependency with a local
+fake of configurable latency and size: YouTubeTranscriptApi.get_transcript,
+ChatOpenAI, get_weather and the Express mood/watch-history endpoints. Audio
+for /analyze-emotion/ is synthesized. Prints one JSON document with
+throughput, p50/p95/p99 latency and status counts per endpoint, plus peak
+RSS, so runs before and after a change can be diffed.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import resource
+import sys
+import time
+import types
+
+import httpx
+
+# Add current directory to path
+sys.path.insert(0, '.')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", default="chapters,emotion,recommendations",
+                        help="comma-separated subset to run")
+    parser.add_argument("--requests", type=int, default=100,
+                        help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5,
+                        help="seconds per fake LLM call")
+    parser.add_argument("--upstream-latency", type=float, default=0.05,
+                        help="seconds per fake Express API call")
+    parser.add_argument("--weather-latency", type=float, default=0.2)
+    parser.add_argument("--transcript-latency", type=float, default=0.3)
+    parser.add_argument("--transcript-entries", type=int, default=2000,
+                        help="caption lines per fake transcript")
+    parser.add_argument("--history-items", type=int, default=20,
+                        help="entries per fake watch history")
+    parser.add_argument("--chapter-mode", choices=["llm", "local", "auto"],
+                        help="mode sent with chapter requests")
+    parser.add_argument("--audio-seconds", default="2,5,10",
+                        help="clip lengths to cycle through")
+    parser.add_argument("--repeat-inputs", action="store_true",
+                        help="reuse video ids, users and clips (measures caches)")
+    parser.add_argument("--fake-model", action="store_true",
+                        help="tiny random classifier instead of the real model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    return parser.parse_args()
+
+
+# --- Fakes -----------------------------------------------------------------
+
+WORDS = ("the quick brown fox jumps over lazy dog lecture topic example "
+         "question answer model data result stream chat video part next").split()
+MOODS = ("Happiness", "Sadness", "Anger", "Neutral")
+GENRES = ("Comedy", "Drama", "Action", "Thriller", "Romance", "Sci-Fi",
+          "Documentary", "Animation")
+
+
+def fake_transcript(video_id, num_entries):
+    rng = random.Random(video_id)
+    entries = []
+    t = 0.0
+    for _ in range(num_entries):
+        duration = round(rng.uniform(2.0, 4.0), 2)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+        entries.append({"text": text, "start": round(t, 2), "duration": duration})
+        t += duration
+    return entries
+
+
+def install_fake_youtube(args):
+    """A stand-in youtube_transcript_api module, imported lazily by main."""
+    def get_transcript(video_id, *a, **kw):
+        time.sleep(args.transcript_latency)  # main runs this in a thread
+        return fake_transcript(video_id, args.transcript_entries)
+
+    module = types.ModuleType("youtube_transcript_api")
+    module.YouTubeTranscriptApi = type(
+        "YouTubeTranscriptApi", (), {"get_transcript": staticmethod(get_transcript)})
+    sys.modules["youtube_transcript_api"] = module
+
+
+def install_fake_openai(args, counters):
+    """A stand-in langchain_openai.ChatOpenAI answering both prompts."""
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    async def respond(prompt_value):
+        counters["llm_calls"] += 1
+        await asyncio.sleep(args.llm_latency)
+        text = prompt_value.to_string()
+        if "Transcript chunks:" in text:
+            starts = [float(x) for x in re.findall(r'"start": ([\d.]+)', text)]
+            ends = [float(x) for x in re.findall(r'"end": ([\d.]+)', text)]
+            chapters = [
+                {"start": start, "end": end, "title": f"Part at {int(start)} seconds"}
+                for start, end in zip(starts[::4], ends[3::4] + ends[-1:])
+            ]
+            return AIMessage(content=json.dumps(chapters))
+        queries = random.sample(["action", "comedy", "drama", "thriller",
+                                 "romance", "documentary", "anime"], 7)
+        return AIMessage(content=json.dumps([
+            {"query": q, "reason": "benchmark", "priority": 10 - i}
+            for i, q in enumerate(queries)]))
+
+    module = types.ModuleType("langchain_openai")
+    module.ChatOpenAI = lambda **kwargs: RunnableLambda(
+        lambda _: None, afunc=respond)
+    sys.modules["langchain_openai"] = module
+
+
+def install_fake_model():
+    import torch
+    from speechbrain.dataio.encoder import CategoricalEncoder
+    from speechbrain.nnet.activations import Softmax
+    from speechbrain.nnet.linear import Linear
+    from speechbrain.nnet.pooling import StatisticsPooling
+    from custom_interface import CustomEncoderWav2vec2Classifier
+
+    class TinyEncoder(torch.nn.Module):
+        """wav2vec2-shaped output (20 ms frames, 768 dims) at a fraction of the cost"""
+        def __init__(self):
+            super().__init__()
+            self.conv = torch.nn.Conv1d(1, 768, 400, stride=320)
+            self.linear = torch.nn.Linear(768, 768)
+
+        def forward(self, wav, wav_lens=None):
+            return self.linear(self.conv(wav.unsqueeze(1)).transpose(1, 2))
+
+    def from_hparams(cls, **kwargs):
+        label_encoder = CategoricalEncoder()
+        label_encoder.load("label_encoder.txt")
+        label_encoder.expect_len(4)
+        modules = {
+            "wav2vec2": TinyEncoder(),
+            "avg_pool": StatisticsPooling(return_std=False),
+            "output_mlp": Linear(input_size=768, n_neurons=4, bias=False),
+        }
+        hparams = {"encoder_dim": 768, "out_n_neurons": 4,
+                   "label_encoder": label_encoder, "softmax": Softmax()}
+        return cls(modules=modules, hparams=hparams)
+
+    CustomEncoderWav2vec2Classifier.from_hparams = classmethod(from_hparams)
+
+
+def upstream_handler(args):
+    async def handler(request):
+        await asyncio.sleep(args.upstream_latency)
+        user_id = request.url.path.rsplit("/", 1)[-1]
+        rng = random.Random(user_id)
+        if "/mood-history/" in request.url.path:
+            distribution = {mood: rng.randint(0, 10) for mood in MOODS}
+            now = time.time()
+            return httpx.Response(200, json={
+                "moods": [
+                    {"emotion": mood, "confidence": 0.9,
+                     "timestamp": now - 3600 * (i + j)}
+                    for i, (mood, count) in enumerate(distribution.items())
+                    for j in range(count)
+                ],
+                "aggregatedData": {
+                    "dominantMood": max(distribution, key=distribution.get),
+                    "moodDistribution": distribution,
+                },
+                "moodTrend": rng.choice(["stable", "improving", "declining"]),
+            })
+        if "/watch-history/" in request.url.path:
+            return httpx.Response(200, json={"watchHistory": [
+                {"title": f"Title {rng.randint(1, 10000)}",
+                 "genre": rng.sample(GENRES, 2),
+                 "completed": rng.random() < 0.6}
+                for _ in range(args.history_items)
+            ]})
+        return httpx.Response(404)
+    return handler
+
+
+def synthetic_wav(seconds, seed, sample_rate=16000):
+    """Voiced-ish audio: a wandering tone with harmonics plus noise."""
+    import numpy as np
+    import soundfile as sf
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * rng.uniform(0.2, 1.0) * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 5))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    audio = 0.2 * signal * envelope + 0.01 * rng.standard_normal(t.size)
+    buf = io.BytesIO()
+    sf.write(buf, audio.astype("float32"), sample_rate, format="WAV")
+    return buf.getvalue()
+
+
+# --- Load generation -------------------------------------------------------
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1,
+                       int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def drive(name, make_request, requests, concurrency):
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await make_request(i)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "statuses": statuses,
+    }
+
+
+async def run(args):
+    counters = {"llm_calls": 0}
+
+    install_fake_youtube(args)
+    install_fake_openai(args, counters)
+    if args.fake_model:
+        install_fake_model()
+
+    import main
+
+    async def fake_weather(location="Delhi"):
+        await asyncio.sleep(args.weather_latency)
+        return f"Current weather in {location}: Partly cloudy +27°C"
+    main.get_weather = fake_weather
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    clip_lengths = [float(s) for s in args.audio_seconds.split(",")]
+    clips = {}
+    report = {"endpoints": {}}
+
+    async with main.lifespan(main.app):
+        await main.app.state.http_client.aclose()
+        main.app.state.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(upstream_handler(args)))
+        if "emotion" in endpoints:
+            started = time.perf_counter()
+            await main.emotion_model.load()
+            report["model_load_seconds"] = round(time.perf_counter() - started, 3)
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=None) as client:
+            def key(i):
+                return i % max(1, args.concurrency) if args.repeat_inputs else i
+
+            async def chapters(i):
+                body = {"video_id": f"bench-{args.seed}-{key(i)}"}
+                if args.chapter_mode:
+                    body["mode"] = args.chapter_mode
+                response = await client.post("/api/generate-chapters", json=body)
+                return response.status_code
+
+            async def emotion(i):
+                seconds = clip_lengths[i % len(clip_lengths)]
+                seed = args.seed * 1_000_003 + key(i)
+                if (seconds, seed) not in clips:
+                    clips[(seconds, seed)] = await asyncio.to_thread(
+                        synthetic_wav, seconds, seed)
+                response = await client.post(
+                    "/analyze-emotion/",
+                    files={"file": ("clip.wav", clips[(seconds, seed)], "audio/wav")})
+                return response.status_code
+
+            served_by = {}
+
+            async def recommendations(i):
+                response = await client.post(
+                    "/api/generate-recommendations",
+                    json={"user_id": f"user-{args.seed}-{key(i)}"})
+                if response.status_code == 200:
+                    path = response.json()["context"].get("served_by", "unknown")
+                    served_by[path] = served_by.get(path, 0) + 1
+                return response.status_code
+
+            drivers = {"chapters": chapters, "emotion": emotion,
+                       "recommendations": recommendations}
+            for name in endpoints:
+                llm_before = counters["llm_calls"]
+                result = await drive(name, drivers[name], args.requests,
+                                     args.concurrency)
+                result["llm_calls"] = counters["llm_calls"] - llm_before
+                if name == "recommendations":
+                    result["served_by"] = served_by
+                report["endpoints"][name] = result
+                print(f"{name}: {result['throughput_rps']} req/s, "
+                      f"p50 {result['latency_ms']['p50']} ms, "
+                      f"p99 {result['latency_ms']['p99']} ms", file=sys.stderr)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    report["peak_rss_mb"] = round(peak_mb, 1)
+    report["config"] = {k: v for k, v in vars(args).items()
+                        if k != "output"}
+    report["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    return report
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    # Caches start empty and stay in memory for every run
+    for name in ("CHAPTER_CACHE_DB", "EMOTION_CACHE_DB", "CHAPTER_JOBS_DB",
+                 "USER_PROFILE_DB"):
+        os.environ[name] = ""
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("EMOTION_MODEL_LOAD", "lazy")
+
+    # The app logs with print; keep stdout for the report alone
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
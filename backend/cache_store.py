@@ -0,0 +1,238 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is not None:
+            value, expires = item
+            if expires is None or expires > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        if self.max_entries == 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SQLiteCache:
+    """On-disk cache of JSON values with optional TTL, evicting least
+    recently used entries once the stored values exceed ``max_bytes``.
+
+    Several caches can share one database file through ``table``, and
+    several processes one table: the stored size is read from the database
+    on every write rather than tracked per process.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, table="cache",
+                 ttl=None):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.table = table
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " expires REAL)"
+        )
+        columns = [row[1] for row in self._db.execute(
+            f"PRAGMA table_info({table})")]
+        if "expires" not in columns:
+            # Databases created before TTL support
+            self._db.execute(f"ALTER TABLE {table} ADD COLUMN expires REAL")
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+        # Lets the size sum skip the (possibly overflowing) value blobs
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_size ON {table} (size)")
+        self._db.commit()
+
+    def _stored_bytes(self):
+        return self._db.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """``(value, expires)`` for a live entry, or None; ``expires`` is an
+        epoch time or None for entries without a TTL"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value, size, expires FROM {self.table} WHERE key = ?",
+                (key,)).fetchone()
+            if row is not None and row[2] is not None and row[2] <= now:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute(
+                f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0]), row[2]
+
+    def set(self, key, value, ttl=None):
+        blob = json.dumps(value).encode()
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table}"
+                " (key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, expires))
+            self._evict(now)
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict(self, now):
+        # Runs inside set()'s write transaction, so the size read here
+        # includes other processes' writes and can't change under us
+        size = self._stored_bytes()
+        if size <= self.max_bytes:
+            return
+        # Expired entries go first, then least recently used
+        expired = self._db.execute(
+            f"DELETE FROM {self.table} WHERE expires <= ? RETURNING size",
+            (now,)).fetchall()
+        size -= sum(row_size for row_size, in expired)
+
+        while size > self.max_bytes:
+            rows = self._db.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, row_size in rows:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                size -= row_size
+                if size <= self.max_bytes:
+                    break
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            stored_bytes = self._stored_bytes()
+        return {
+            "entries": len(self),
+            "bytes": stored_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class TieredCache:
+    """Memory LRU in front of an optional on-disk tier.
+
+    Disk hits are promoted to memory for whatever TTL they have left;
+    writes go to both tiers.
+    """
+
+    def __init__(self, max_entries=1024, path=None,
+                 max_bytes=256 * 1024 * 1024, table="cache", ttl=None):
+        self.memory = LRUCache(max_entries, ttl=ttl)
+        self.disk = SQLiteCache(path, max_bytes, table=table, ttl=ttl) \
+            if path else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is None:
+                # 0 means no TTL, unlike None, which means the default
+                self.memory.set(key, value, ttl=0)
+            elif expires > time.time():
+                self.memory.set(key, value, ttl=expires - time.time())
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,317 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class PermanentJobError(Exception):
+    """The job can never succeed (e.g. the video has no captions); not retried."""
+
+
+class ChapterJobQueue:
+    """Background chapter generation with job state in SQLite.
+
+    ``process(video_id, mode)`` is awaited by up to ``workers`` concurrent
+    workers and returns the job's JSON-serializable result. Exceptions are
+    retried with exponential backoff (``backoff`` seconds, doubling) up to
+    ``max_attempts`` attempts; ``PermanentJobError`` fails the job at once.
+
+    Several processes can share one database. A worker claims a job with a
+    conditional update that records it as the owner for ``lease`` seconds
+    and renews the lease while the job runs; every process periodically
+    picks up queued jobs (including ones submitted elsewhere) and jobs
+    whose lease ran out because their process died. Only the owner of a
+    live lease records the outcome, so a job never runs twice at once.
+    """
+
+    def __init__(self, path, process, workers=2, max_attempts=3, backoff=5.0,
+                 lease=60.0, table="chapter_jobs"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid job table name: {table}")
+        self.process = process
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff = backoff
+        self.lease = lease
+        self.table = table
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " id TEXT PRIMARY KEY,"
+            " video_id TEXT NOT NULL,"
+            " mode TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " result TEXT,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " next_attempt REAL,"
+            " owner TEXT,"
+            " lease_until REAL)"
+        )
+        columns = [row[1] for row in self._db.execute(
+            f"PRAGMA table_info({table})")]
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                # Databases created before leases
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_video"
+            f" ON {table} (video_id, mode, status)")
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_status"
+            f" ON {table} (status, next_attempt)")
+        self._db.commit()
+        self._queue = None
+        self._tasks = []
+        self._timers = {}
+        self._pending = set()
+        self._waiters = {}
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            rows = cursor.fetchall()
+            self._db.commit()
+            return rows, cursor.rowcount
+
+    def _update_owned(self, job_id, **fields):
+        """Update a job we hold the lease on; False if the lease was lost"""
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        _, changed = self._execute(
+            f"UPDATE {self.table} SET {assignments}"
+            " WHERE id = ? AND owner = ? AND status = 'running'",
+            (*fields.values(), job_id, self.owner))
+        if not changed:
+            print(f"Chapter job {job_id}: lease lost, leaving it to its new owner")
+        return bool(changed)
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def start(self):
+        """Start the workers and the sweeper that finds claimable jobs."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._work())
+                       for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._sweep()))
+
+    async def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._pending.clear()
+        # Hand interrupted jobs straight back instead of waiting for the
+        # lease to run out
+        self._execute(
+            f"UPDATE {self.table} SET status = 'queued', owner = NULL,"
+            " lease_until = NULL WHERE owner = ? AND status = 'running'",
+            (self.owner,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _schedule(self, job_id, delay=0.0):
+        if self._queue is None or job_id in self._pending:
+            # Not started; the sweeper picks it up on start
+            return
+        self._pending.add(job_id)
+        if delay <= 0:
+            self._queue.put_nowait(job_id)
+            return
+        self._timers[job_id] = asyncio.get_running_loop().call_later(
+            delay, self._wake, job_id)
+
+    def _wake(self, job_id):
+        self._timers.pop(job_id, None)
+        self._queue.put_nowait(job_id)
+
+    def _claimable(self):
+        """Queued jobs that are due and running jobs whose lease expired"""
+        now = time.time()
+        rows, _ = self._execute(
+            f"SELECT id FROM {self.table}"
+            " WHERE (status = 'queued' AND COALESCE(next_attempt, 0) <= ?)"
+            " OR (status = 'running' AND lease_until < ?)"
+            " ORDER BY created",
+            (now, now))
+        return [row["id"] for row in rows]
+
+    async def _sweep(self):
+        while True:
+            for job_id in self._claimable():
+                self._schedule(job_id)
+            await asyncio.sleep(self.lease / 3)
+
+    def submit(self, video_id, mode, force=False):
+        """Queue a job unless one for the same video and mode is queued,
+        running or (without ``force``) already done.
+
+        Returns ``(job, deduplicated)``.
+        """
+        statuses = ("queued", "running") if force else ("queued", "running", "done")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            # Check and insert in one write transaction, so two processes
+            # can't both add a job for the same video
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT * FROM {self.table} WHERE video_id = ? AND mode = ?"
+                    f" AND status IN ({', '.join('?' * len(statuses))})"
+                    " ORDER BY created DESC LIMIT 1",
+                    (video_id, mode, *statuses)).fetchone()
+                if row is None:
+                    self._db.execute(
+                        f"INSERT INTO {self.table}"
+                        " (id, video_id, mode, status, created, updated)"
+                        " VALUES (?, ?, ?, 'queued', ?, ?)",
+                        (job_id, video_id, mode, now, now))
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+        if row is not None:
+            return self._to_dict(row), True
+
+        self._schedule(job_id)
+        return self.get(job_id), False
+
+    def get(self, job_id):
+        rows, _ = self._execute(
+            f"SELECT * FROM {self.table} WHERE id = ?", (job_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    async def wait(self, job_id, timeout, poll_interval=1.0):
+        """The job once it is done or failed, or as it is after ``timeout``.
+
+        Jobs finished here wake the waiter at once; the database is polled
+        every ``poll_interval`` seconds for jobs another process runs.
+        """
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        if job is None or job["status"] in ("done", "failed"):
+            return job
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(
+                        event.wait(), min(remaining, poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                job = self.get(job_id)
+                if job is None or job["status"] in ("done", "failed"):
+                    return job
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    def _finish(self, job_id, **fields):
+        self._update_owned(job_id, **fields)
+        for event in self._waiters.pop(job_id, ()):
+            event.set()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            self._pending.discard(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Chapter job {job_id} crashed: {e}")
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self._update_owned(job_id, lease_until=time.time() + self.lease)
+
+    async def _run(self, job_id):
+        # Claim the job; another worker or process may have got it first
+        now = time.time()
+        _, claimed = self._execute(
+            f"UPDATE {self.table} SET status = 'running',"
+            " attempts = attempts + 1, owner = ?, lease_until = ?, updated = ?"
+            " WHERE id = ? AND (status = 'queued' AND COALESCE(next_attempt, 0) <= ?"
+            " OR status = 'running' AND lease_until < ?)",
+            (self.owner, now + self.lease, now, job_id, now, now))
+        job = self.get(job_id)
+        if not claimed:
+            # A retry timer can fire a moment before next_attempt
+            if job and job["status"] == "queued" and job["next_attempt"]:
+                self._schedule(job_id, job["next_attempt"] - now)
+            return
+        if job["attempts"] > self.max_attempts:
+            # Its earlier attempts died with their process
+            self._finish(job_id, status="failed",
+                         error=job["error"] or "Worker stopped during the job")
+            return
+
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            result = await self.process(job["video_id"], job["mode"])
+        except PermanentJobError as e:
+            print(f"Chapter job {job_id} ({job['video_id']}) failed: {e}")
+            self._finish(job_id, status="failed", error=str(e))
+            return
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            if job["attempts"] >= self.max_attempts:
+                print(f"Chapter job {job_id} ({job['video_id']}) failed "
+                      f"after {job['attempts']} attempts: {error}")
+                self._finish(job_id, status="failed", error=error)
+                return
+            delay = self.backoff * 2 ** (job["attempts"] - 1)
+            print(f"Chapter job {job_id} ({job['video_id']}) attempt "
+                  f"{job['attempts']} failed, retrying in {delay}s: {error}")
+            if self._update_owned(job_id, status="queued", error=error,
+                                  next_attempt=time.time() + delay):
+                self._schedule(job_id, delay)
+            return
+        finally:
+            heartbeat.cancel()
+
+        self._finish(job_id, status="done", error=None,
+                     result=json.dumps(result))
+
+    def stats(self):
+        rows, _ = self._execute(
+            f"SELECT status, COUNT(*) AS n FROM {self.table} GROUP BY status")
+        counts = {row["status"]: row["n"] for row in rows}
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "queue": self._queue.qsize() if self._queue else 0,
+            "delayed": len(self._timers),
+            **{status: counts.get(status, 0)
+               for status in ("queued", "running", "done", "failed")},
+        }
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import re
+import time
+
+import tiktoken
+
+from metrics import span
+
+
+class ChapterGenerationError(Exception):
+    """LLM call or response parsing failed for a batch of chunks."""
+
+
+# Seconds before retrying a tiktoken load that failed
+TOKEN_COUNTER_RETRY = 60.0
+
+_token_counters = {}
+_token_counter_failed = {}
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def get_token_counter(model):
+    """Token counting function for ``model``.
+
+    tiktoken downloads its BPE files on first use, so call this off the
+    event loop (or warm it at startup). Without network it falls back to
+    the usual ~4 characters per token estimate and tries again after
+    ``TOKEN_COUNTER_RETRY`` seconds.
+    """
+    if model in _token_counters:
+        return _token_counters[model]
+    if time.monotonic() - _token_counter_failed.get(model, -TOKEN_COUNTER_RETRY) \
+            < TOKEN_COUNTER_RETRY:
+        return estimate_tokens
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Models newer than this tiktoken release
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"tiktoken unavailable, estimating token counts: {e}")
+        _token_counter_failed[model] = time.monotonic()
+        return estimate_tokens
+    _token_counter_failed.pop(model, None)
+    _token_counters[model] = lambda text: len(encoding.encode(text))
+    return _token_counters[model]
+
+
+def format_chunk(chunk):
+    return {"start": chunk["start"], "end": chunk["end"], "text": chunk["text"]}
+
+
+def batch_chunks(chunked, max_tokens, model):
+    """Group consecutive chunks so each batch's JSON fits in ``max_tokens``.
+
+    A chunk larger than the budget on its own gets a batch to itself.
+    """
+    count_tokens = get_token_counter(model)
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for chunk in chunked:
+        tokens = count_tokens(json.dumps(format_chunk(chunk))) + 1
+        if batch and batch_tokens + tokens > max_tokens:
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_chapters(response):
+    """Parse the model's JSON array, tolerating markdown code fences."""
+    text = response.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    chapters = json.loads(text)
+    if not isinstance(chapters, list):
+        raise json.JSONDecodeError("Expected a JSON array", text, 0)
+    return chapters
+
+
+def clean_chapter(chapter, batch_start=None, batch_end=None):
+    """Validate one chapter dict; returns None if it is unusable."""
+    try:
+        start = float(chapter["start"])
+        end = float(chapter["end"])
+        title = str(chapter["title"]).strip()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not title:
+        return None
+    # Keep the model from inventing times outside the chunks it was given
+    if batch_start is not None:
+        start = min(max(start, batch_start), batch_end)
+        end = min(max(end, start), batch_end)
+    return {"start": round(start, 2), "end": round(end, 2), "title": title}
+
+
+def merge_chapters(chapters):
+    """Order chapters and merge neighbours that repeat the same title."""
+    merged = []
+    for chapter in sorted(chapters, key=lambda c: (c["start"], c["end"])):
+        if merged:
+            previous = merged[-1]
+            same_title = (previous["title"].casefold().strip(" .!")
+                          == chapter["title"].casefold().strip(" .!"))
+            if same_title or chapter["start"] == previous["start"]:
+                previous["end"] = max(previous["end"], chapter["end"])
+                continue
+            # Overlapping chunks: cut the previous chapter where this starts
+            previous["end"] = min(previous["end"], chapter["start"])
+        merged.append(dict(chapter))
+    return merged
+
+
+async def generate_batch(chain, batch, semaphore):
+    chunks_text = json.dumps([format_chunk(chunk) for chunk in batch])
+    async with semaphore:
+        try:
+            with span("chapters", "llm"):
+                message = await chain.ainvoke({"transcript_chunks": chunks_text})
+        except Exception as e:
+            raise ChapterGenerationError(f"OpenAI API error: {str(e)}") from e
+
+    response = getattr(message, "content", message)
+    try:
+        with span("chapters", "parse"):
+            chapters = parse_chapters(response)
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse response: {response}")
+        raise ChapterGenerationError(
+            f"Failed to parse AI response: {str(e)}") from e
+
+    batch_start, batch_end = batch[0]["start"], batch[-1]["end"]
+    cleaned = [clean_chapter(c, batch_start, batch_end) for c in chapters
+               if isinstance(c, dict)]
+    return [c for c in cleaned if c is not None]
+
+
+async def generate_chapters_map_reduce(chain, chunked, model, max_tokens=3000,
+                                       concurrency=4):
+    """Title token-budgeted batches of chunks concurrently, then merge.
+
+    ``chain`` is a runnable taking ``transcript_chunks`` (e.g. ``prompt |
+    llm``). Wall-clock time follows the slowest batch instead of growing
+    with the whole transcript.
+    """
+    # Counting tokens may load tiktoken's files; keep it off the loop
+    batches = await asyncio.to_thread(batch_chunks, chunked, max_tokens, model)
+    print(f"Generating chapters for {len(chunked)} chunks in {len(batches)} batches")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [asyncio.ensure_future(generate_batch(chain, batch, semaphore))
+             for batch in batches]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # One failed batch fails the whole result (or the caller gave up):
+        # don't keep paying for the batches still in flight
+        for task in tasks:
+            task.cancel()
+    return merge_chapters([c for chapters in results for c in chapters])
+
+
+class JSONArrayStream:
+    """Pulls complete objects out of a JSON array as its text streams in.
+
+    Only brace depth and string state are tracked, so anything around the
+    objects (``[``, commas, markdown fences) is ignored and an object that
+    fails to parse is skipped instead of failing the whole array.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.skipped = 0
+
+    def feed(self, text):
+        objects = []
+        for ch in text:
+            if self._depth == 0:
+                if ch == "{":
+                    self._buffer = [ch]
+                    self._depth = 1
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+        return objects
+
+
+async def stream_batch(chain, batch, index, semaphore, queue):
+    chunks_text = json.dumps([format_chunk(chunk) for chunk in batch])
+    batch_start, batch_end = batch[0]["start"], batch[-1]["end"]
+    parser = JSONArrayStream()
+    try:
+        async with semaphore:
+            with span("chapters_stream", "llm"):
+                async for message in chain.astream(
+                        {"transcript_chunks": chunks_text}):
+                    text = getattr(message, "content", message)
+                    for obj in parser.feed(text):
+                        chapter = clean_chapter(obj, batch_start, batch_end) \
+                            if isinstance(obj, dict) else None
+                        if chapter is not None:
+                            await queue.put(
+                                {"type": "chapter", "batch": index, **chapter})
+                        else:
+                            parser.skipped += 1
+        if parser.skipped:
+            print(f"Skipped {parser.skipped} malformed chapters in batch {index}")
+    except Exception as e:
+        await queue.put({"type": "error", "batch": index,
+                         "detail": f"OpenAI API error: {str(e)}"})
+
+
+async def stream_chapters(chain, chunked, model, max_tokens=3000,
+                          concurrency=4):
+    """Like ``generate_chapters_map_reduce`` but yields events as the model
+    writes them: ``chapter`` events (in arrival order, tagged with their
+    batch) and ``error`` events for batches that failed. The last event is
+    a ``summary`` with the merged chapter list.
+    """
+    # Counting tokens may load tiktoken's files; keep it off the loop
+    batches = await asyncio.to_thread(batch_chunks, chunked, max_tokens, model)
+    print(f"Streaming chapters for {len(chunked)} chunks in {len(batches)} batches")
+
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.ensure_future(stream_batch(chain, batch, i, semaphore, queue))
+        for i, batch in enumerate(batches)
+    ]
+
+    async def close_when_done():
+        # stream_batch reports failures as events, so this only ends when
+        # every batch has finished
+        await asyncio.gather(*tasks)
+        await queue.put(None)
+
+    closer = asyncio.ensure_future(close_when_done())
+
+    chapters = []
+    failed = []
+    try:
+        while (event := await queue.get()) is not None:
+            if event["type"] == "chapter":
+                chapters.append({k: event[k] for k in ("start", "end", "title")})
+            else:
+                failed.append(event["batch"])
+            yield event
+    finally:
+        # Client went away: stop paying for batches nobody will read
+        for task in tasks + [closer]:
+            task.cancel()
+
+    yield {
+        "type": "summary",
+        "chapters": merge_chapters(chapters),
+        "batches": len(batches),
+        "failed_batches": failed,
+    }
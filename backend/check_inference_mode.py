@@ -0,0 +1,93 @@
+import sys
+import os
+import time
+import torch
+
+# Add current directory to path
+sys.path.insert(0, '.')
+
+from custom_interface import CustomEncoderWav2vec2Classifier, INFERENCE_MODES
+from memory_stats import process_memory
+
+EXAMPLE_FILES = ['anger.wav', 'hap.wav', 'neutral.wav', 'sad.wav']
+
+# Largest probability difference we accept against the float model
+TOLERANCE = float(os.getenv("INFERENCE_MODE_TOLERANCE", "0.05"))
+
+
+def rss_mb():
+    try:
+        return process_memory()["rss_mb"]
+    except OSError:
+        return None
+
+
+def load(mode):
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    classifier = CustomEncoderWav2vec2Classifier.from_hparams(
+        source=".",
+        hparams_file="hyperparams.yaml",
+        inference_mode=mode
+    )
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()
+    memory = f", RSS +{rss_after - rss_before:.0f} MB" \
+        if rss_before is not None else ""
+    print(f"Loaded {mode} model in {elapsed:.2f}s{memory}")
+    return classifier
+
+
+def predict(classifier, waveform, runs=3):
+    """Return probabilities and the best latency over ``runs`` calls"""
+    # First call pays for compilation/warm-up
+    out_prob, _, _, _ = classifier.classify_waveform(waveform)
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        with torch.no_grad():
+            out_prob, _, _, _ = classifier.classify_waveform(waveform)
+        best = min(best, time.perf_counter() - start)
+    return out_prob.squeeze(), best
+
+
+def compare(mode, audio_files):
+    # Candidate first, so its RSS growth doesn't reuse memory the float
+    # model's loading already mapped
+    candidate = load(mode)
+    reference = load("float")
+
+    ok = True
+    print(f"\n{'file':15} {'max |dp|':>9} {'argmax':>7} {'float ms':>9} {mode + ' ms':>12}")
+    for audio_file in audio_files:
+        waveform = reference.load_audio(audio_file)
+        ref_prob, ref_time = predict(reference, waveform)
+        cand_prob, cand_time = predict(candidate, waveform)
+
+        diff = (ref_prob - cand_prob).abs().max().item()
+        same = ref_prob.argmax().item() == cand_prob.argmax().item()
+        ok = ok and same and diff <= TOLERANCE
+        print(f"{audio_file:15} {diff:9.4f} {'same' if same else 'DIFF':>7} "
+              f"{ref_time * 1000:9.1f} {cand_time * 1000:12.1f}")
+
+    print(f"\n{'✓' if ok else '✗'} {mode} {'matches' if ok else 'does not match'} "
+          f"the float model (tolerance {TOLERANCE})")
+    return ok
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "int8"
+    if mode not in INFERENCE_MODES:
+        print(f"Usage: python {sys.argv[0]} [{'|'.join(INFERENCE_MODES)}] [audio files...]")
+        sys.exit(2)
+
+    audio_files = sys.argv[2:] or [f for f in EXAMPLE_FILES if os.path.exists(f)]
+    if not audio_files:
+        print("No audio files found to test with")
+        sys.exit(2)
+
+    sys.exit(0 if compare(mode, audio_files) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+
+class ComponentNotReady(Exception):
+    """A lazily loaded component hasn't finished loading, or failed to."""
+
+
+class LazyComponent:
+    """Something slow to build (a model, an SDK) that loads once.
+
+    ``factory`` runs in a worker thread the first time ``start`` or
+    ``load`` is called, so the event loop keeps serving other routes
+    meanwhile. ``state`` goes pending -> loading -> ready or failed; a
+    failed component stays failed until the process restarts.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.state = "pending"
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self._task = None
+
+    def start(self):
+        """Begin loading in the background if not already started."""
+        if self._task is None:
+            self.state = "loading"
+            self._task = asyncio.ensure_future(self._load())
+        return self._task
+
+    async def load(self):
+        """Load (or wait for the load in progress) and return the value."""
+        await asyncio.shield(self.start())
+        return self.get()
+
+    async def _load(self):
+        started = time.perf_counter()
+        try:
+            self.value = await asyncio.to_thread(self.factory)
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+        self.seconds = round(time.perf_counter() - started, 3)
+        print(f"Loading {self.name}: {self.state} after {self.seconds}s"
+              + (f" ({self.error})" if self.error else ""))
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self):
+        if not self.ready:
+            detail = f": {self.error}" if self.error else ""
+            raise ComponentNotReady(f"{self.name} is {self.state}{detail}")
+        return self.value
+
+    def status(self):
+        return {"state": self.state, "seconds": self.seconds,
+                "error": self.error}
+
+
+@contextmanager
+def timed_phase(phases, name):
+    """Record how long the block took in ``phases[name]`` and log it."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = round(time.perf_counter() - started, 3)
+        print(f"Startup phase {name}: {phases[name]}s")
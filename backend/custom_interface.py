@@ -1,9 +1,66 @@
+import io
+import os
+import soundfile as sf
 import torch
+import torchaudio
 from speechbrain.inference.interfaces import Pretrained
+
+
+def decode_audio(data, audio_normalizer, device="cpu"):
+    """Decode an in-memory audio file to a mono waveform at the model rate.
+
+    ``data`` can be bytes, a memoryview or a file-like object such as a
+    spooled upload. Mixing to mono and resampling happen in memory.
+    """
+    source = data if hasattr(data, "read") else io.BytesIO(data)
+    try:
+        signal, sr = sf.read(source, dtype="float32", always_2d=True)
+        signal = torch.from_numpy(signal)
+    except sf.LibsndfileError:
+        # Formats libsndfile can't read (mp3, webm...) go through torchaudio
+        source.seek(0)
+        signal, sr = torchaudio.load(source, channels_first=False)
+    signal = signal.to(device)
+    return audio_normalizer(signal, sr)
+
+
+INFERENCE_MODES = ("float", "int8", "compile", "int8-compile")
+
+
 class CustomEncoderWav2vec2Classifier(Pretrained):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, inference_mode=None, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # Explicit argument, then EMOTION_INFERENCE_MODE, then hyperparams.yaml
+        self.inference_mode = (
+            inference_mode
+            or os.getenv("EMOTION_INFERENCE_MODE")
+            or getattr(self.hparams, "inference_mode", "float")
+        )
+        self._apply_inference_mode(self.inference_mode)
+
+    def _apply_inference_mode(self, mode):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(
+                f"Unknown inference_mode '{mode}', expected one of {INFERENCE_MODES}")
+
+        if mode in ("int8", "int8-compile"):
+            if torch.device(self.device).type != "cpu":
+                raise ValueError("int8 inference is only supported on CPU")
+            # Dynamic quantization: int8 weights for every Linear layer,
+            # activations quantized on the fly. This is where the transformer
+            # spends its time and most of its memory. In place, because
+            # hparams (pretrainer, modules) hold the same module and a copy
+            # would keep the float weights alive next to the int8 ones.
+            self.mods["wav2vec2"] = torch.ao.quantization.quantize_dynamic(
+                self.mods["wav2vec2"], {torch.nn.Linear}, dtype=torch.qint8,
+                inplace=True)
+
+        if mode in ("compile", "int8-compile"):
+            # Clip lengths vary per request, so avoid recompiling per shape
+            self.mods["wav2vec2"] = torch.compile(
+                self.mods["wav2vec2"], dynamic=True)
+
     def encode_batch(self, wavs, wav_lens=None, normalize=False):
         # Manage single waveforms in input
         if len(wavs.shape) == 1:
@@ -17,8 +74,8 @@ class CustomEncoderWav2vec2Classifier(Pretrained):
         wavs, wav_lens = wavs.to(self.device), wav_lens.to(self.device)
         wavs = wavs.float()
 
-        # Computing features and embeddings
-        outputs = self.mods.wav2vec2(wavs)
+        # Computing features and embeddings (wav_lens masks batch padding)
+        outputs = self.mods.wav2vec2(wavs, wav_lens)
 
         # last dim will be used for AdaptativeAVG pool
         outputs = self.mods.avg_pool(outputs, wav_lens)
@@ -26,15 +83,28 @@ class CustomEncoderWav2vec2Classifier(Pretrained):
         return outputs
 
     def classify_batch(self, wavs, wav_lens=None):
-        outputs = self.encode_batch(wavs, wav_lens)
-        outputs = self.mods.output_mlp(outputs)
+        embeddings = self.encode_batch(wavs, wav_lens)
+        return self.classify_embeddings(embeddings)
+
+    def classify_embeddings(self, embeddings):
+        outputs = self.mods.output_mlp(embeddings)
         out_prob = self.hparams.softmax(outputs)
         score, index = torch.max(out_prob, dim=-1)
         text_lab = self.hparams.label_encoder.decode_torch(index)
         return out_prob, score, index, text_lab
 
+    def load_audio_bytes(self, data):
+        return decode_audio(data, self.audio_normalizer, self.device)
+
     def classify_file(self, path):
         waveform = self.load_audio(path)
+        return self.classify_waveform(waveform)
+
+    def classify_bytes(self, data):
+        waveform = self.load_audio_bytes(data)
+        return self.classify_waveform(waveform)
+
+    def classify_waveform(self, waveform):
         # Fake a batch:
         batch = waveform.unsqueeze(0)
         rel_length = torch.tensor([1.0])
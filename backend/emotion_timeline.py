@@ -0,0 +1,47 @@
+def window_starts(num_samples, window, hop):
+    """Sample offsets of fixed-size windows covering ``num_samples``.
+
+    The last window is shifted back to end exactly at the clip end, so every
+    window has the same length and batches need no padding. Clips shorter
+    than one window yield a single window over the whole clip.
+    """
+    if num_samples <= window:
+        return [0]
+    starts = list(range(0, num_samples - window + 1, hop))
+    if starts[-1] + window < num_samples:
+        starts.append(num_samples - window)
+    return starts
+
+
+def iter_windows(waveform, sample_rate, window_s, hop_s):
+    """Yield ``(start_s, end_s, chunk)`` for each window of a 1-D waveform.
+
+    Chunks are views into ``waveform``; nothing is copied until a batch of
+    them is padded together for the encoder.
+    """
+    window = max(1, int(window_s * sample_rate))
+    hop = max(1, int(hop_s * sample_rate))
+    num_samples = waveform.shape[-1]
+    for start in window_starts(num_samples, window, hop):
+        end = min(start + window, num_samples)
+        yield start / sample_rate, end / sample_rate, waveform[start:end]
+
+
+def batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def aggregate_probabilities(segments):
+    """Duration-weighted mean of each segment's ``probabilities`` dict."""
+    totals = {}
+    total_duration = 0.0
+    for segment in segments:
+        duration = segment["end"] - segment["start"]
+        total_duration += duration
+        for name, prob in segment["probabilities"].items():
+            totals[name] = totals.get(name, 0.0) + prob * duration
+
+    if total_duration <= 0:
+        return totals
+    return {name: value / total_duration for name, value in totals.items()}
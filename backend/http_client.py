@@ -0,0 +1,25 @@
+import importlib.util
+import os
+
+import httpx
+
+
+def create_http_client():
+    """Pooled client shared by all requests for the app's lifetime.
+
+    Keep-alive connections to the Express API and wttr.in are reused
+    instead of paying TCP/TLS setup per request. HTTP/2 is used when the
+    optional ``h2`` package is installed.
+    """
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=30.0
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("HTTP_TIMEOUT", "5")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+        )
+    )
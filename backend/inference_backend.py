@@ -0,0 +1,194 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import torch
+from speechbrain.dataio.preprocess import AudioNormalizer
+from speechbrain.utils.data_utils import batch_pad_right
+
+from custom_interface import CustomEncoderWav2vec2Classifier, decode_audio
+from metrics import BATCH_SIZE, STAGE_SECONDS
+
+
+# Model owned by a process-pool worker, loaded once by its initializer
+_worker_classifier = None
+
+# Model loaded by preload_classifier() before this process forked
+_preloaded_classifier = None
+
+# Fraction of batches run under torch.profiler, and where traces go
+PROFILE_SAMPLE_RATE = float(os.getenv("EMOTION_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("EMOTION_PROFILE_DIR", "profiles")
+
+# One clip's classifier output plus its pooled wav2vec2 embedding
+Prediction = namedtuple(
+    "Prediction", ["out_prob", "score", "index", "text_lab", "embedding"])
+
+
+def _profiler():
+    """A torch.profiler context for a sampled batch, else a no-op one."""
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return nullcontext()
+    return torch.profiler.profile(
+        activities=[torch.profiler.ProfilerActivity.CPU],
+        record_shapes=True
+    )
+
+
+def classify_padded(classifier, waveforms, timings=None):
+    """Run 1-D waveforms through the classifier as one padded batch.
+
+    Returns one ``Prediction`` per waveform. Seconds spent padding, in the
+    encoder and in the MLP head are stored in ``timings`` if given.
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    # Right-pad to the longest clip; wav_lens holds each clip's
+    # relative length so pooling ignores the padding
+    wavs, wav_lens = batch_pad_right([wav.float() for wav in waveforms])
+    timings["pad"] = time.perf_counter() - started
+
+    with _profiler() as profiler, torch.no_grad():
+        started = time.perf_counter()
+        embeddings = classifier.encode_batch(wavs, wav_lens)
+        timings["encoder"] = time.perf_counter() - started
+        started = time.perf_counter()
+        out_prob, score, index, text_lab = classifier.classify_embeddings(
+            embeddings)
+        timings["mlp"] = time.perf_counter() - started
+
+    if profiler is not None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(
+            PROFILE_DIR, f"emotion-{os.getpid()}-{time.time_ns()}.json")
+        profiler.export_chrome_trace(path)
+        print(f"Wrote torch profile of a batch of {len(waveforms)} to {path}")
+
+    return [
+        Prediction(out_prob[i], score[i], index[i], text_lab[i],
+                   embeddings[i].cpu())
+        for i in range(len(waveforms))
+    ]
+
+
+def preload_classifier(source=".", hparams_file="hyperparams.yaml"):
+    """Load the model now so processes forked from this one share it.
+
+    Thread backends created afterwards (in this process or its forked
+    children) reuse this model instead of loading their own; the weights
+    are only read during inference, so their pages stay shared
+    copy-on-write. Call it before torch runs any parallel op: intra-op
+    thread pools don't survive fork.
+    """
+    global _preloaded_classifier
+    torch.set_num_threads(1)
+    _preloaded_classifier = CustomEncoderWav2vec2Classifier.from_hparams(
+        source=source,
+        hparams_file=hparams_file
+    )
+    return _preloaded_classifier
+
+
+def _init_process_worker(source, hparams_file, num_threads):
+    global _worker_classifier
+    torch.set_num_threads(num_threads)
+    _worker_classifier = CustomEncoderWav2vec2Classifier.from_hparams(
+        source=source,
+        hparams_file=hparams_file
+    )
+
+
+def _process_classify(waveforms):
+    timings = {}
+    predictions = classify_padded(_worker_classifier, waveforms, timings)
+    return predictions, timings
+
+
+class InferenceBackend:
+    """Where emotion inference runs, so torch never blocks the event loop.
+
+    ``kind="thread"`` shares one in-process model between ``workers``
+    threads; ``kind="process"`` starts ``workers`` processes that each load
+    the model once. ``num_threads`` caps torch's intra-op threads per
+    worker so workers don't oversubscribe the CPU.
+    """
+
+    def __init__(self, kind="thread", workers=1, num_threads=None,
+                 source=".", hparams_file="hyperparams.yaml"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference backend: {kind}")
+
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.num_threads = num_threads or max(
+            1, (os.cpu_count() or 1) // self.workers)
+        self.classifier = None
+
+        if kind == "thread":
+            torch.set_num_threads(self.num_threads)
+            if _preloaded_classifier is not None:
+                self.classifier = _preloaded_classifier
+            else:
+                self.classifier = CustomEncoderWav2vec2Classifier.from_hparams(
+                    source=source,
+                    hparams_file=hparams_file
+                )
+            self._audio_normalizer = self.classifier.audio_normalizer
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="emotion-inference"
+            )
+        else:
+            # Decoding stays in this process; the model lives in the workers
+            self._audio_normalizer = AudioNormalizer()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # fork after torch has started its thread pools can deadlock
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(source, hparams_file, self.num_threads)
+            )
+
+    @classmethod
+    def from_env(cls, source=".", hparams_file="hyperparams.yaml"):
+        num_threads = os.getenv("EMOTION_TORCH_THREADS")
+        return cls(
+            kind=os.getenv("EMOTION_BACKEND", "thread"),
+            workers=int(os.getenv("EMOTION_WORKERS", "1")),
+            num_threads=int(num_threads) if num_threads else None,
+            source=source,
+            hparams_file=hparams_file
+        )
+
+    @property
+    def sample_rate(self):
+        return self._audio_normalizer.sample_rate
+
+    async def decode(self, data):
+        """Decode uploaded audio bytes off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, decode_audio, data, self._audio_normalizer)
+
+    async def classify(self, waveforms):
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            timings = {}
+            predictions = await loop.run_in_executor(
+                self._executor, classify_padded, self.classifier, waveforms,
+                timings)
+        else:
+            predictions, timings = await loop.run_in_executor(
+                self._executor, _process_classify, waveforms)
+
+        BATCH_SIZE.observe(len(waveforms))
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, route="emotion_batch", stage=stage)
+        return predictions
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,116 @@
+import asyncio
+
+
+class SchedulerBusy(Exception):
+    """Raised when the inference queue is full; callers should retry later."""
+
+
+class BatchScheduler:
+    """Groups concurrent emotion requests into padded batches.
+
+    Each request submits one waveform and awaits its own result. A single
+    background task drains the queue, waiting at most ``max_wait_ms`` after
+    the first waveform arrives for up to ``max_batch_size`` waveforms, then
+    hands the batch to the inference backend. Up to one batch per backend
+    worker runs at a time; meanwhile new requests keep queueing and form
+    the next batch. At most ``max_pending`` requests may be queued or
+    running, beyond that ``submit`` raises ``SchedulerBusy``.
+    """
+
+    def __init__(self, backend, max_batch_size=8, max_wait_ms=10.0,
+                 max_pending=64):
+        self.backend = backend
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_pending = max(1, int(max_pending))
+        self.pending = 0
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._running = set()
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.backend.workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(self._worker, *self._running,
+                             return_exceptions=True)
+        self._worker = None
+
+    async def submit(self, waveform):
+        """Queue a 1-D waveform and return its ``Prediction``."""
+        if self.pending >= self.max_pending:
+            raise SchedulerBusy(
+                f"{self.pending} emotion requests already pending")
+
+        self.start()
+        self.pending += 1
+        try:
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((waveform, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without yielding
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Requests whose client went away don't need a slot in the batch
+        return [(wav, fut) for wav, fut in batch if not fut.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first so the batch keeps filling
+            # while every worker is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = loop.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            results = await self.backend.classify([wav for wav, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,253 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# Common English words and caption filler that make poor topic words
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at
+be because been before being below between both but by can can't cannot
+could couldn't did didn't do does doesn't doing don't down during each few
+for from further get gets getting go going gonna got had hadn't has hasn't
+have haven't having he he'd he'll he's her here here's hers herself him
+himself his how how's i i'd i'll i'm i've if in into is isn't it it's its
+itself just know let's like lot make me more most mustn't my myself need no
+nor not now of off okay on once one only or other ought our ours ourselves
+out over own really right same say says see shan't she she'd she'll she's
+should shouldn't so some something such than that that's the their theirs
+them themselves then there there's these they they'd they'll they're
+they've thing things think this those through to too um uh under until up
+us very want was wasn't way we we'd we'll we're we've well were weren't
+what what's when when's where where's which while who who's whom why why's
+will with won't would wouldn't yeah yes you you'd you'll you're you've your
+yours yourself yourselves actually basically kind sort music applause
+laughter
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z][a-z'\-]*[a-z]|[a-z]")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower())
+            if len(t) > 2 and t not in STOPWORDS]
+
+
+def _blocks(cleaned, block_seconds):
+    """Group entries into consecutive blocks of about ``block_seconds``."""
+    block_of_entry = np.empty(len(cleaned), dtype=np.int64)
+    block = 0
+    block_start = cleaned[0]["start"]
+    for i, entry in enumerate(cleaned):
+        if entry["start"] - block_start >= block_seconds:
+            block += 1
+            block_start = entry["start"]
+        block_of_entry[i] = block
+    return block_of_entry, block + 1
+
+
+def _tfidf(counts):
+    """Log-scaled, L2-normalized TF-IDF rows from sparse block x term counts."""
+    num_blocks = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((num_blocks + 1) / (df + 1)) + 1
+    vectors = counts.copy()
+    vectors.data = (np.log1p(vectors.data) * idf[vectors.indices]).astype(np.float32)
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+    # Scale each row by 1/norm without densifying
+    vectors.data /= np.repeat(np.maximum(norms, 1e-9), np.diff(vectors.indptr))
+    return vectors
+
+
+def _window_sums(vectors, window):
+    """Sparse sums of the ``window`` blocks before and after each gap."""
+    from scipy import sparse
+
+    n = vectors.shape[0]
+    gaps = np.arange(1, n)
+    offsets = np.arange(window)
+
+    def band(columns):
+        rows = np.repeat(np.arange(len(gaps)), window)
+        columns = columns.ravel()
+        valid = (columns >= 0) & (columns < n)
+        matrix = sparse.csr_matrix(
+            (np.ones(valid.sum(), np.float32), (rows[valid], columns[valid])),
+            shape=(len(gaps), n))
+        return matrix @ vectors
+
+    left = band(gaps[:, None] - 1 - offsets)
+    right = band(gaps[:, None] + offsets)
+    return left, right
+
+
+def _depth_scores(vectors, window):
+    """TextTiling-style depth of the similarity dip at each block gap.
+
+    Gap ``i`` sits before block ``i``; it compares the ``window`` blocks
+    on each side. ``vectors`` is a sparse block x term matrix. Returns an
+    array of len(vectors) with 0 at gap 0.
+    """
+    left, right = _window_sums(vectors, window)
+
+    def row_sums(matrix):
+        return np.asarray(matrix.sum(axis=1)).ravel()
+
+    norms = np.sqrt(row_sums(left.multiply(left))) \
+        * np.sqrt(row_sums(right.multiply(right)))
+    similarity = row_sums(left.multiply(right)) / np.maximum(norms, 1e-9)
+
+    # Light smoothing so single noisy blocks don't make boundaries
+    if len(similarity) >= 3:
+        similarity = np.convolve(
+            np.pad(similarity, 1, mode="edge"), np.ones(3) / 3, mode="valid")
+
+    # Highest similarity within ``window`` gaps on each side
+    padded = np.pad(similarity, window, mode="edge")
+    peaks = np.lib.stride_tricks.sliding_window_view(padded, window + 1)
+    left_peak = peaks[:len(similarity)].max(axis=1)
+    right_peak = peaks[window:window + len(similarity)].max(axis=1)
+    depth = (left_peak - similarity) + (right_peak - similarity)
+    return np.concatenate([[0.0], depth])
+
+
+def _pick_boundaries(depth, block_starts, min_seconds, min_chapters,
+                     max_chapters):
+    """Deepest gaps first, keeping chapters at least ``min_seconds`` long.
+
+    Gaps that aren't clearly deeper than average are only used to reach
+    ``min_chapters``.
+    """
+    candidates = depth[1:]
+    if not len(candidates):
+        return [0]
+    # Only dips clearly deeper than typical (random) variation
+    cutoff = candidates.mean() + candidates.std()
+    chosen = [0]
+    for gap in np.argsort(-depth, kind="stable"):
+        if len(chosen) >= max_chapters:
+            break
+        if depth[gap] <= max(cutoff, 0) and len(chosen) >= min_chapters:
+            break
+        if gap == 0:
+            continue
+        start = block_starts[gap]
+        if all(abs(start - block_starts[c]) >= min_seconds for c in chosen) \
+                and block_starts[-1] - start >= min_seconds / 2:
+            chosen.append(int(gap))
+    return sorted(chosen)
+
+
+def _title(segment_tokens, term_scores, vocab_index, max_phrases=3):
+    """Title from the segment's most distinctive words and word pairs."""
+    ranked = sorted(set(segment_tokens),
+                    key=lambda t: (-term_scores[vocab_index[t]], t))
+    top = ranked[:8]
+    if not top:
+        return None
+    top_set = set(top)
+
+    # Recurring pairs of top words read better than the words alone
+    pairs = Counter(
+        (a, b) for a, b in zip(segment_tokens, segment_tokens[1:])
+        if a != b and a in top_set and b in top_set)
+    phrases = []
+    used = set()
+    for (a, b), count in pairs.most_common():
+        if count < 3 or len(phrases) >= max_phrases:
+            break
+        if a not in used and b not in used:
+            phrases.append(f"{a} {b}")
+            used.update((a, b))
+    for word in top:
+        if len(phrases) >= max_phrases:
+            break
+        if word not in used:
+            phrases.append(word)
+            used.add(word)
+
+    phrases = [p.title() for p in phrases]
+    if len(phrases) == 1:
+        return phrases[0]
+    return ", ".join(phrases[:-1]) + " and " + phrases[-1]
+
+
+def segment_transcript(cleaned, block_seconds=30.0, window=3,
+                       min_chapter_seconds=90.0, max_chapters=None):
+    """Chapters for a cleaned transcript without calling a model.
+
+    Entries are grouped into ``block_seconds`` blocks and turned into TF-IDF
+    vectors; boundaries go where the vocabulary of the ``window`` blocks
+    before a gap differs most from the ``window`` blocks after it
+    (TextTiling depth scores), at least ``min_chapter_seconds`` apart. Each
+    chapter is titled from its most distinctive words. Returns dicts with
+    ``start``, ``end`` and ``title`` like the LLM path.
+    """
+    if not cleaned:
+        return []
+
+    duration = cleaned[-1]["end"] - cleaned[0]["start"]
+    if max_chapters is None:
+        # About one chapter per five minutes, within sensible bounds
+        max_chapters = int(min(max(duration / 300, 1), 30))
+    # Long videos get a chapter at least every 20 minutes or so
+    min_chapters = int(min(duration // 1200, max_chapters))
+
+    block_of_entry, num_blocks = _blocks(cleaned, block_seconds)
+    entry_tokens = [tokenize(entry["text"]) for entry in cleaned]
+
+    vocab = sorted({t for tokens in entry_tokens for t in tokens})
+    if not vocab:
+        return [{"start": round(cleaned[0]["start"], 2),
+                 "end": round(cleaned[-1]["end"], 2), "title": "Full Video"}]
+    vocab_index = {t: i for i, t in enumerate(vocab)}
+    token_ids = np.fromiter(
+        (vocab_index[t] for tokens in entry_tokens for t in tokens), np.int64)
+    token_blocks = np.repeat(
+        block_of_entry, [len(tokens) for tokens in entry_tokens])
+
+    # Sparse: a dense blocks x vocabulary matrix grows with duration times
+    # vocabulary and runs out of memory on day-long streams
+    from scipy import sparse
+    counts = sparse.csr_matrix(
+        (np.ones(len(token_ids), np.float32), (token_blocks, token_ids)),
+        shape=(num_blocks, len(vocab)))
+    counts.sum_duplicates()
+    vectors = _tfidf(counts)
+
+    block_starts = np.full(num_blocks, np.inf)
+    np.minimum.at(block_starts, block_of_entry,
+                  [entry["start"] for entry in cleaned])
+
+    depth = _depth_scores(vectors, max(1, window)) if num_blocks > 2 \
+        else np.zeros(num_blocks)
+    boundaries = _pick_boundaries(
+        depth, block_starts, min_chapter_seconds, min_chapters, max_chapters)
+
+    # Term weights per chapter against how many chapters use the term;
+    # only chapters x vocabulary (at most 30 rows) is made dense
+    segment_of_block = np.searchsorted(boundaries, np.arange(num_blocks),
+                                       side="right") - 1
+    membership = sparse.csr_matrix(
+        (np.ones(num_blocks, np.float32),
+         (segment_of_block, np.arange(num_blocks))),
+        shape=(len(boundaries), num_blocks))
+    segment_counts = (membership @ counts).toarray()
+    segment_df = np.count_nonzero(segment_counts, axis=0)
+    segment_idf = np.log((len(boundaries) + 1) / (segment_df + 1)) + 1
+    segment_scores = np.log1p(segment_counts) * segment_idf
+
+    entry_segment = segment_of_block[block_of_entry]
+    chapters = []
+    for segment in range(len(boundaries)):
+        entries = np.flatnonzero(entry_segment == segment)
+        if not len(entries):
+            continue
+        tokens = [t for i in entries for t in entry_tokens[i]]
+        title = _title(tokens, segment_scores[segment], vocab_index) \
+            or f"Part {segment + 1}"
+        chapters.append({
+            "start": round(cleaned[entries[0]]["start"], 2),
+            "end": round(cleaned[entries[-1]]["end"], 2),
+            "title": title,
+        })
+    return chapters
@@ -1,33 +1,123 @@
-from custom_interface import CustomEncoderWav2vec2Classifier
-from fastapi import FastAPI, HTTPException, File, UploadFile
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from inference_scheduler import BatchScheduler, SchedulerBusy
+from emotion_timeline import iter_windows, batched, aggregate_probabilities
+from components import LazyComponent, ComponentNotReady, timed_phase
+from memory_stats import process_memory
+from metrics import REGISTRY, REQUEST_SECONDS, span
+from cache_store import LRUCache, TieredCache
+from transcripts import clean_transcript, chunk_transcript
+from singleflight import SingleFlight, coalesce
+from chapter_pipeline import (
+    generate_chapters_map_reduce, stream_chapters, get_token_counter,
+    ChapterGenerationError)
+from local_chapters import segment_transcript
+from chapter_jobs import ChapterJobQueue, PermanentJobError
+from http_client import create_http_client
+from ttl_cache import AsyncTTLCache
+from recommendations import (
+    ALLOWED_QUERIES, build_context, context_from_summaries,
+    parse_search_queries, local_recommendations)
+from user_profiles import UserProfileStore
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from youtube_transcript_api import YouTubeTranscriptApi
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_openai import ChatOpenAI
 import os
 import json
-import uuid
-import shutil
-import torch
-from typing import List
+import asyncio
+import functools
+import hashlib
+from collections import namedtuple
+from typing import Dict, List, Literal, Optional
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from datetime import datetime
-import httpx
-from langchain.tools import tool
-from langchain.agents import initialize_agent, AgentType
-import httpx
+
+# torch/speechbrain (emotion model), langchain and youtube_transcript_api
+# take seconds to import, so they are imported where first used and the
+# app can serve requests before they are loaded
 
 
 # Load environment variables
 load_dotenv()
 
-# Your existing imports for emotion recognition
+# How the emotion model loads: "background" starts loading at startup
+# without delaying it, "eager" finishes loading before serving and "lazy"
+# waits for the first emotion request. Until it is ready emotion routes
+# answer 503 with Retry-After.
+EMOTION_MODEL_LOAD = os.getenv("EMOTION_MODEL_LOAD", "background")
+
+# Components that must be ready for /health/ready to pass
+READINESS_REQUIRES = [
+    name.strip() for name in
+    os.getenv("READINESS_REQUIRES", "http_client").split(",") if name.strip()
+]
+
+# Seconds per startup phase, reported by /health/ready
+STARTUP_PHASES = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    STARTUP_PHASES["imports"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    print(f"Startup phase imports: {STARTUP_PHASES['imports']}s")
+
+    with timed_phase(STARTUP_PHASES, "http_client"):
+        # Shared for the app's lifetime instead of rebuilt per request
+        app.state.http_client = create_http_client()
+    with timed_phase(STARTUP_PHASES, "chapter_jobs"):
+        chapter_jobs.start()
+    with timed_phase(STARTUP_PHASES, "emotion_model"):
+        if EMOTION_MODEL_LOAD == "eager":
+            await emotion_model.load()
+        elif EMOTION_MODEL_LOAD == "background":
+            emotion_model.start()
+    with timed_phase(STARTUP_PHASES, "llm_chains"):
+        if os.getenv("OPENAI_API_KEY"):
+            llm_chains.start()
+
+    yield
+
+    await chapter_jobs.stop()
+    if emotion_model.ready:
+        await emotion_model.value.scheduler.stop()
+        emotion_model.value.backend.shutdown()
+    await app.state.http_client.aclose()
+    for cache in (emotion_cache, transcript_cache, chapter_cache, chapter_jobs,
+                  user_profiles):
+        cache.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep series bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status)
+
+
+@app.exception_handler(ComponentNotReady)
+async def component_not_ready(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": os.getenv("COMPONENT_RETRY_AFTER", "5")}
+    )
 
 # Add CORS middleware
 app.add_middleware(
@@ -44,6 +134,24 @@ class RecommendationRequest(BaseModel):
     limit: int = 10
 
 
+class ProfileEvent(BaseModel):
+    user_id: str
+    type: Literal["watch", "mood"]
+    # When it happened; defaults to when it is ingested
+    timestamp: Optional[datetime] = None
+    # Watch events (content_id or title identifies the item)
+    content_id: Optional[str] = None
+    title: Optional[str] = None
+    genre: List[str] = []
+    completed: bool = False
+    # Mood events
+    emotion: Optional[str] = None
+
+
+class ProfileEventBatch(BaseModel):
+    events: List[ProfileEvent]
+
+
 class SearchQuery(BaseModel):
     query: str
     reason: str
@@ -56,8 +164,31 @@ class RecommendationResponse(BaseModel):
     generated_at: str
 
 
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[str]
+    limit: int = 10
+
+
+class BatchRecommendationResponse(BaseModel):
+    results: Dict[str, RecommendationResponse]
+    errors: Dict[str, str]
+
+
 class VideoChapterRequest(BaseModel):
     video_id: str
+    # "llm", "local" (no network beyond the transcript) or "auto" (LLM,
+    # falling back to local); defaults to CHAPTER_DEFAULT_MODE
+    mode: Optional[Literal["llm", "local", "auto"]] = None
+
+
+class ChapterJobRequest(BaseModel):
+    video_ids: List[str]
+    # Defaults to "llm" with an API key and "local" without; "auto" would
+    # let a failed LLM run finish the job with local chapters instead of
+    # retrying it
+    mode: Optional[Literal["llm", "local"]] = None
+    # Run again even if the video already has a finished job
+    force: bool = False
 
 
 class TranscriptHeader(BaseModel):
@@ -70,161 +201,200 @@ class ChaptersResponse(BaseModel):
     chapters: List[TranscriptHeader]
 
 
-def clean_transcript(raw_transcript):
-    cleaned = []
-    for entry in raw_transcript:
-        start = round(entry["start"], 2)
-        end = round(entry["start"] + entry["duration"], 2)
-        text = entry["text"].strip()
-        if text:
-            cleaned.append({
-                "start": start,
-                "end": end,
-                "text": text
-            })
+CHAPTER_MODEL = "gpt-4.1-nano"
+CHAPTER_CHUNK_SIZE = 500
+CHAPTER_CHUNK_OVERLAP = 50
+
+# Chunks are titled in batches of at most this many prompt tokens, with up
+# to CHAPTER_CONCURRENCY batches in flight
+CHAPTER_BATCH_TOKENS = int(os.getenv("CHAPTER_BATCH_TOKENS", "3000"))
+CHAPTER_CONCURRENCY = int(os.getenv("CHAPTER_CONCURRENCY", "4"))
+
+CHAPTER_PROMPT_TEMPLATE = """
+You are a highly intelligent assistant that summarizes video transcripts into concise chapter titles.
+
+Generate a clear, meaningful title for each transcript section. These will be used as clickable timestamps.
+
+Instructions:
+- Output a JSON array of objects
+- Each object must have: "start" (float), "end" (float), "title" (string)
+- Titles should be 3-8 words, descriptive and engaging
+- Capitalize properly (e.g., "Introduction to the Topic", "Key Concepts Explained")
+
+Transcript chunks:
+{transcript_chunks}
+
+Return only the JSON array without any markdown formatting or explanation.
+"""
+
+# Anything that changes the generated chapters invalidates cached ones
+CHAPTER_VERSION = hashlib.sha256(
+    f"{CHAPTER_MODEL}:{CHAPTER_CHUNK_SIZE}:{CHAPTER_CHUNK_OVERLAP}:"
+    f"{CHAPTER_BATCH_TOKENS}:{CHAPTER_PROMPT_TEMPLATE}".encode()
+).hexdigest()[:16]
+
+# Cleaned transcripts and finished chapters, in memory and in a local
+# SQLite file (CHAPTER_CACHE_DB, a path on a writable volume). Unset, the
+# cache stays in memory so the app also runs on read-only filesystems.
+CHAPTER_CACHE_DB = os.getenv("CHAPTER_CACHE_DB", "")
+CHAPTER_CACHE_TTL = float(os.getenv("CHAPTER_CACHE_TTL", str(7 * 24 * 3600)))
+
+transcript_cache = TieredCache(
+    max_entries=int(os.getenv("TRANSCRIPT_CACHE_SIZE", "128")),
+    path=CHAPTER_CACHE_DB or None,
+    max_bytes=int(os.getenv("TRANSCRIPT_CACHE_DB_MAX_MB", "512")) * 1024 * 1024,
+    table="transcripts",
+    ttl=CHAPTER_CACHE_TTL,
+)
+chapter_cache = TieredCache(
+    max_entries=int(os.getenv("CHAPTER_CACHE_SIZE", "1024")),
+    path=CHAPTER_CACHE_DB or None,
+    max_bytes=int(os.getenv("CHAPTER_CACHE_DB_MAX_MB", "64")) * 1024 * 1024,
+    table="chapters",
+    ttl=CHAPTER_CACHE_TTL,
+)
+
+
+def chapter_cache_key(video_id):
+    return f"{CHAPTER_VERSION}:{video_id}"
+
+
+CHAPTER_DEFAULT_MODE = os.getenv("CHAPTER_DEFAULT_MODE", "auto")
+
+
+def chapter_mode(request):
+    """The request's chapter mode; "auto" without an API key means local"""
+    mode = request.mode or CHAPTER_DEFAULT_MODE
+    if mode == "auto" and not os.getenv("OPENAI_API_KEY"):
+        return "local"
+    return mode
+
+
+async def local_chapters(cleaned):
+    # Not cached: it takes well under a second, and a later LLM run
+    # should still get the chance to replace it
+    with span("chapters", "local_segmentation"):
+        return await asyncio.to_thread(segment_transcript, cleaned)
+
+
+NO_CAPTIONS_RESPONSE = {
+    "chapters": [],
+    "error": "This video doesn't have captions available. AI timestamps can only be generated for videos with subtitles/captions enabled.",
+    "error_type": "no_captions"
+}
+
+
+class NoCaptionsError(Exception):
+    pass
+
+
+async def get_cleaned_transcript(video_id):
+    """Cleaned transcript from the cache, or fetched from YouTube and cached"""
+    cleaned = transcript_cache.get(video_id)
+    if cleaned is not None:
+        return cleaned
+
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    try:
+        raw_transcript = await asyncio.to_thread(
+            YouTubeTranscriptApi.get_transcript, video_id)
+        print(f"Got transcript with {len(raw_transcript)} entries")
+    except Exception as e:
+        error_message = str(e)
+        if "Subtitles are disabled" in error_message or "Could not retrieve a transcript" in error_message:
+            raise NoCaptionsError(error_message)
+        raise HTTPException(
+            status_code=400, detail=f"Failed to fetch transcript: {error_message}")
+
+    cleaned = clean_transcript(raw_transcript)
+    transcript_cache.set(video_id, cleaned)
     return cleaned
 
 
-def chunk_transcript(cleaned_transcript, chunk_size=500, chunk_overlap=50):
-    full_text = " ".join([entry["text"] for entry in cleaned_transcript])
+@functools.lru_cache(maxsize=None)
+def build_chapter_chain(api_key):
+    from langchain.prompts import PromptTemplate
+    from langchain_openai import ChatOpenAI
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        is_separator_regex=False,
+    prompt = PromptTemplate(
+        input_variables=["transcript_chunks"],
+        template=CHAPTER_PROMPT_TEMPLATE
     )
 
-    chunks = splitter.split_text(full_text)
-
-    # Map character index to timestamp ranges
-    full_char_index = 0
-    index_map = []
-    for entry in cleaned_transcript:
-        start_idx = full_char_index
-        end_idx = full_char_index + len(entry["text"]) + 1
-        index_map.append((start_idx, end_idx, entry["start"], entry["end"]))
-        full_char_index = end_idx
-
-    # Find approximate start/end for each chunk
-    chunked_output = []
-    current_pointer = 0
-    for chunk in chunks:
-        chunk_len = len(chunk)
-        chunk_start_idx = current_pointer
-        chunk_end_idx = current_pointer + chunk_len
-
-        chunk_start = None
-        chunk_end = None
-        for start_idx, end_idx, start_time, end_time in index_map:
-            if end_idx >= chunk_start_idx and chunk_start is None:
-                chunk_start = start_time
-            if start_idx <= chunk_end_idx:
-                chunk_end = end_time
-
-        chunked_output.append({
-            "start": round(chunk_start, 2) if chunk_start is not None else 0,
-            "end": round(chunk_end, 2) if chunk_end is not None else 0,
-            "text": chunk.strip()
-        })
-
-        current_pointer += chunk_len
+    try:
+        llm = ChatOpenAI(
+            model=CHAPTER_MODEL,
+            temperature=0.3,
+            openai_api_key=api_key
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to initialize OpenAI: {str(e)}")
 
-    return chunked_output
+    return prompt | llm
 
 
 @app.post("/api/generate-chapters")
+@coalesce(lambda request: (request.video_id, chapter_mode(request)))
 async def generate_chapters(request: VideoChapterRequest):
+    mode = chapter_mode(request)
     try:
+        if mode != "local":
+            # Finished chapters need neither YouTube nor OpenAI
+            with span("chapters", "cache_lookup"):
+                cached_chapters = chapter_cache.get(
+                    chapter_cache_key(request.video_id))
+            if cached_chapters is not None:
+                return {"chapters": cached_chapters, "engine": "llm"}
+
         # Check if OpenAI API key is set
         api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        if mode == "llm" and not api_key:
             raise HTTPException(
                 status_code=500, detail="OpenAI API key not configured")
 
-        print(f"Processing video ID: {request.video_id}")
+        print(f"Processing video ID: {request.video_id} ({mode})")
 
         # Get transcript
         try:
-            raw_transcript = YouTubeTranscriptApi.get_transcript(
-                request.video_id)
-            print(f"Got transcript with {len(raw_transcript)} entries")
-        except Exception as e:
-            error_message = str(e)
-            if "Subtitles are disabled" in error_message or "Could not retrieve a transcript" in error_message:
-                # Return a user-friendly error for videos without captions
-                return {
-                    "chapters": [],
-                    "error": "This video doesn't have captions available. AI timestamps can only be generated for videos with subtitles/captions enabled.",
-                    "error_type": "no_captions"
-                }
-            raise HTTPException(
-                status_code=400, detail=f"Failed to fetch transcript: {error_message}")
-
-        cleaned = clean_transcript(raw_transcript)
-        chunked = chunk_transcript(cleaned, chunk_size=500, chunk_overlap=50)
+            with span("chapters", "transcript_fetch"):
+                cleaned = await get_cleaned_transcript(request.video_id)
+        except NoCaptionsError:
+            # Return a user-friendly error for videos without captions
+            return NO_CAPTIONS_RESPONSE
+
+        if mode == "local":
+            return {"chapters": await local_chapters(cleaned), "engine": "local"}
+
+        with span("chapters", "chunking"):
+            chunked = chunk_transcript(
+                cleaned, chunk_size=CHAPTER_CHUNK_SIZE, chunk_overlap=CHAPTER_CHUNK_OVERLAP)
         print(f"Created {len(chunked)} chunks")
 
         # Generate chapter titles using LangChain
-        prompt = PromptTemplate(
-            input_variables=["transcript_chunks"],
-            template="""
-You are a highly intelligent assistant that summarizes video transcripts into concise chapter titles.
-
-Generate a clear, meaningful title for each transcript section. These will be used as clickable timestamps.
-
-Instructions:
-- Output a JSON array of objects
-- Each object must have: "start" (float), "end" (float), "title" (string)
-- Titles should be 3-8 words, descriptive and engaging
-- Capitalize properly (e.g., "Introduction to the Topic", "Key Concepts Explained")
-
-Transcript chunks:
-{transcript_chunks}
-
-Return only the JSON array without any markdown formatting or explanation.
-"""
-        )
-
-        try:
-            llm = ChatOpenAI(
-                model="gpt-4.1-nano",
-                temperature=0.3,
-                openai_api_key=api_key
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to initialize OpenAI: {str(e)}")
-
-        chain = LLMChain(llm=llm, prompt=prompt)
-
-        # Format chunks for the prompt
-        chunks_text = json.dumps([{
-            "start": chunk["start"],
-            "end": chunk["end"],
-            "text": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"]
-        } for chunk in chunked])
+        chain = await asyncio.to_thread(build_chapter_chain, api_key)
 
         print("Calling OpenAI...")
 
         try:
-            response = chain.run(transcript_chunks=chunks_text)
-            # Print first 100 chars
-            print(f"OpenAI response: {response[:100]}...")
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"OpenAI API error: {str(e)}")
-
-        # Parse the response
-        try:
-            chapters = json.loads(response)
+            chapters = await generate_chapters_map_reduce(
+                chain,
+                chunked,
+                model=CHAPTER_MODEL,
+                max_tokens=CHAPTER_BATCH_TOKENS,
+                concurrency=CHAPTER_CONCURRENCY
+            )
             print(f"Parsed {len(chapters)} chapters")
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse response: {response}")
-            raise HTTPException(
-                status_code=500, detail=f"Failed to parse AI response: {str(e)}")
+        except ChapterGenerationError as e:
+            if mode == "auto":
+                print(f"LLM chapters failed, segmenting locally: {e}")
+                return {"chapters": await local_chapters(cleaned),
+                        "engine": "local"}
+            raise HTTPException(status_code=500, detail=str(e))
 
-        return {"chapters": chapters}
+        chapter_cache.set(chapter_cache_key(request.video_id), chapters)
+        return {"chapters": chapters, "engine": "llm"}
 
     except HTTPException:
         raise
@@ -235,160 +405,494 @@ Return only the JSON array without any markdown formatting or explanation.
         raise HTTPException(
             status_code=500, detail=f"Unexpected error: {str(e)}")
 
-classifier = CustomEncoderWav2vec2Classifier.from_hparams(
-    source=".",
-    hparams_file="hyperparams.yaml"
-)
 
-emotions = {0: 'Neutral', 1: 'Anger', 2: 'Happiness', 3: 'Sadness'}
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-emotion_codes = ['neu', 'ang', 'hap', 'sad']
 
+@app.post("/api/generate-chapters/stream")
+async def generate_chapters_stream(request: VideoChapterRequest):
+    """Server-sent events version of /api/generate-chapters.
 
-@app.post("/analyze-emotion/")
-async def analyze_emotion(file: UploadFile = File(...)):
-    # Save the uploaded file temporarily
-    try:
-        temp_filename = f"temp_{uuid.uuid4()}.wav"
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving file: {e}")
+    Emits a ``chapter`` event for each chapter as soon as the model has
+    written it, ``error`` events for batches that failed, and a final
+    ``summary`` event carrying the merged chapter list and the ``engine``
+    that made it. In local mode the chapters are computed up front and sent
+    the same way; in auto mode failed batches are followed by the local
+    chapters, and the summary lists only those.
+    """
+    mode = chapter_mode(request)
+
+    def replay(chapters, error_event=None, **summary):
+        async def events():
+            if error_event is not None:
+                yield sse_event("error", error_event)
+            for chapter in chapters:
+                yield sse_event("chapter", chapter)
+            yield sse_event("summary", {"chapters": chapters, **summary})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    cache_key = chapter_cache_key(request.video_id)
+    cached_chapters = None
+    if mode != "local":
+        with span("chapters_stream", "cache_lookup"):
+            cached_chapters = chapter_cache.get(cache_key)
+
+    if cached_chapters is not None:
+        return replay(cached_chapters, cached=True, engine="llm")
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if mode == "llm" and not api_key:
+        raise HTTPException(
+            status_code=500, detail="OpenAI API key not configured")
 
     try:
-        # Predict
-        out_prob, score, index, text_lab = classifier.classify_file(
-            temp_filename)
-
-        # Process outputs
-        score_val = score.item() if torch.is_tensor(score) else float(score)
-        index_val = index.item() if torch.is_tensor(index) else int(index)
-        text_lab_val = text_lab[0] if isinstance(
-            text_lab, list) and text_lab else str(text_lab)
-        probs = out_prob.squeeze().tolist() if torch.is_tensor(out_prob) else out_prob
-
-        # Create response
-        result = {
-            "emotion": emotions.get(index_val, "Unknown"),
-            "label": text_lab_val,
-            "confidence": round(score_val, 4),
-            "index": index_val,
-            "probabilities": {
-                emotions[i]: round(probs[i], 4) if i < len(probs) else 0.0
-                for i in range(len(emotions))
-            }
-        }
+        with span("chapters_stream", "transcript_fetch"):
+            cleaned = await get_cleaned_transcript(request.video_id)
+    except NoCaptionsError:
+        # Still an event stream, so EventSource clients see the reason
+        return replay([], error_event={
+            "detail": NO_CAPTIONS_RESPONSE["error"],
+            "error_type": NO_CAPTIONS_RESPONSE["error_type"],
+        }, **{k: v for k, v in NO_CAPTIONS_RESPONSE.items() if k != "chapters"})
+
+    if mode == "local":
+        return replay(await local_chapters(cleaned), engine="local")
+
+    with span("chapters_stream", "chunking"):
+        chunked = chunk_transcript(
+            cleaned, chunk_size=CHAPTER_CHUNK_SIZE, chunk_overlap=CHAPTER_CHUNK_OVERLAP)
+    chain = await asyncio.to_thread(build_chapter_chain, api_key)
+
+    async def events():
+        async for event in stream_chapters(
+            chain,
+            chunked,
+            model=CHAPTER_MODEL,
+            max_tokens=CHAPTER_BATCH_TOKENS,
+            concurrency=CHAPTER_CONCURRENCY
+        ):
+            event_type = event.pop("type")
+            if event_type == "summary":
+                if event["failed_batches"] and mode == "auto":
+                    # As in /api/generate-chapters: segment locally instead
+                    print(f"LLM chapters failed for batches "
+                          f"{event['failed_batches']}, segmenting locally")
+                    event["chapters"] = await local_chapters(cleaned)
+                    event["engine"] = "local"
+                    for chapter in event["chapters"]:
+                        yield sse_event("chapter", chapter)
+                else:
+                    event["engine"] = "llm"
+                    if not event["failed_batches"]:
+                        # Only complete results are worth serving again
+                        chapter_cache.set(cache_key, event["chapters"])
+            yield sse_event(event_type, event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        return JSONResponse(content=result)
 
-    except Exception as e:
+async def run_chapter_job(video_id, mode):
+    """One chapter job; errors other than missing captions are retried."""
+    result = await generate_chapters(
+        VideoChapterRequest(video_id=video_id, mode=mode))
+    if result.get("error_type") == "no_captions":
+        raise PermanentJobError(result["error"])
+    return result
+
+
+# Chapters generated in the background, e.g. for titles just added to the
+# catalog. Job state goes to CHAPTER_JOBS_DB, by default the chapter cache
+# file, and stays in memory if neither is set.
+chapter_jobs = ChapterJobQueue(
+    os.getenv("CHAPTER_JOBS_DB", CHAPTER_CACHE_DB) or ":memory:",
+    run_chapter_job,
+    workers=int(os.getenv("CHAPTER_JOB_WORKERS", "2")),
+    max_attempts=int(os.getenv("CHAPTER_JOB_MAX_ATTEMPTS", "4")),
+    backoff=float(os.getenv("CHAPTER_JOB_BACKOFF", "30")),
+    # Seconds until a job whose worker stopped renewing it is run again
+    lease=float(os.getenv("CHAPTER_JOB_LEASE", "60")),
+)
+CHAPTER_JOB_MAX_BATCH = int(os.getenv("CHAPTER_JOB_MAX_BATCH", "1000"))
+CHAPTER_JOB_MAX_WAIT = 60
+
+
+@app.post("/api/chapter-jobs", status_code=202)
+async def submit_chapter_jobs(request: ChapterJobRequest):
+    """Queue chapter generation for one or more videos.
+
+    Videos with a queued, running or finished job for the same mode get
+    that job back (``deduplicated``) instead of a new one.
+    """
+    video_ids = list(dict.fromkeys(request.video_ids))
+    if len(video_ids) > CHAPTER_JOB_MAX_BATCH:
         raise HTTPException(
-            status_code=500, detail=f"Prediction error: {str(e)}")
+            status_code=400,
+            detail=f"At most {CHAPTER_JOB_MAX_BATCH} videos per request")
+    mode = request.mode or ("llm" if os.getenv("OPENAI_API_KEY") else "local")
 
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    jobs = []
+    for video_id in video_ids:
+        job, deduplicated = chapter_jobs.submit(video_id, mode, request.force)
+        jobs.append({"job_id": job["id"], "video_id": video_id,
+                     "status": job["status"], "deduplicated": deduplicated})
+    return {"jobs": jobs}
 
 
-async def get_weather(location: str = "Delhi") -> str:
-    """Get weather using wttr.in (no API key required)"""
-    try:
-        async with httpx.AsyncClient() as client:
-            # wttr.in provides weather data in various formats
-            response = await client.get(
-                f"https://wttr.in/{location}?format=%C+%t",
-                headers={"User-Agent": "curl"}
-            )
+@app.get("/api/chapter-jobs")
+async def chapter_job_stats():
+    return chapter_jobs.stats()
 
-            if response.status_code == 200:
-                # Response format: "Cloudy +25°C"
-                weather_text = response.text.strip()
-                return f"Current weather in {location}: {weather_text}"
 
-    except Exception as e:
-        print(f"Weather fetch error: {e}")
+@app.get("/api/chapter-jobs/{job_id}")
+async def get_chapter_job(job_id: str, wait: float = 0):
+    """A job's state and, once done, its chapters.
 
-    return "Current weather in Delhi: unknown"
+    With ``wait`` (seconds, at most 60) the response is held until the job
+    is done or failed, so clients can long-poll instead of polling.
+    """
+    if wait > 0:
+        job = await chapter_jobs.wait(job_id, min(wait, CHAPTER_JOB_MAX_WAIT))
+    else:
+        job = chapter_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
 
 
-@app.post("/api/generate-recommendations")
-async def generate_recommendations(request: RecommendationRequest):
+EmotionRuntime = namedtuple("EmotionRuntime", ["backend", "scheduler"])
 
-    try:
 
-        print(f"Generating recommendations for user: {request.user_id}")
+def load_emotion_runtime():
+    # The only place torch and speechbrain get imported on the serving path
+    from inference_backend import InferenceBackend
+
+    # Thread or process pool that runs the model (EMOTION_BACKEND, EMOTION_WORKERS)
+    backend = InferenceBackend.from_env(
+        source=".",
+        hparams_file="hyperparams.yaml"
+    )
+
+    # Concurrent uploads are grouped into padded batches for the encoder
+    scheduler = BatchScheduler(
+        backend,
+        max_batch_size=int(os.getenv("EMOTION_MAX_BATCH_SIZE", "8")),
+        max_wait_ms=float(os.getenv("EMOTION_MAX_WAIT_MS", "10")),
+        max_pending=int(os.getenv("EMOTION_MAX_PENDING", "64")),
+    )
+    return EmotionRuntime(backend, scheduler)
+
+
+emotion_model = LazyComponent("emotion_model", load_emotion_runtime)
+
+
+def emotion_runtime():
+    """The loaded model and its scheduler; raises ComponentNotReady (503)
+    while it is still loading, starting the load if nothing has yet."""
+    emotion_model.start()
+    return emotion_model.get()
 
-        # Fetch user data from MongoDB via Express API
+# Seconds a client should back off when the inference queue is full
+EMOTION_RETRY_AFTER = os.getenv("EMOTION_RETRY_AFTER", "1")
 
-        async with httpx.AsyncClient() as client:
+# Trim silence before the encoder; silent clips skip the model entirely
+EMOTION_VAD = os.getenv("EMOTION_VAD", "1") == "1"
+EMOTION_VAD_SILENCE_DB = float(os.getenv("EMOTION_VAD_SILENCE_DB", "-50"))
 
-            # Get mood history (public endpoint)
+# Results for identical audio, keyed by content hash plus everything that
+# can change the output (model config, inference mode, VAD settings)
+with open(os.path.join(os.path.dirname(__file__), "hyperparams.yaml"), "rb") as f:
+    EMOTION_MODEL_VERSION = hashlib.sha256(
+        f.read()
+        + os.getenv("EMOTION_INFERENCE_MODE", "").encode()
+        + f"vad={EMOTION_VAD}:{EMOTION_VAD_SILENCE_DB}".encode()
+    ).hexdigest()[:16]
+
+emotion_cache = TieredCache(
+    max_entries=int(os.getenv("EMOTION_CACHE_SIZE", "1024")),
+    path=os.getenv("EMOTION_CACHE_DB"),
+    max_bytes=int(os.getenv("EMOTION_CACHE_DB_MAX_MB", "256")) * 1024 * 1024,
+)
+EMOTION_CACHE_EMBEDDINGS = os.getenv("EMOTION_CACHE_EMBEDDINGS", "0") == "1"
 
-            mood_url = f"http://localhost:4000/api/mood-history/{request.user_id}"
 
-            print(f"Fetching mood from: {mood_url}")
+def audio_cache_key(waveform):
+    digest = hashlib.sha256(waveform.float().cpu().numpy().tobytes())
+    return f"{EMOTION_MODEL_VERSION}:{digest.hexdigest()}"
 
-            mood_response = await client.get(mood_url)
 
-            print(f"Mood response status: {mood_response.status_code}")
+emotions = {0: 'Neutral', 1: 'Anger', 2: 'Happiness', 3: 'Sadness'}
+
+emotion_codes = ['neu', 'ang', 'hap', 'sad']
+
+
+def format_prediction(prediction):
+    probs = prediction.out_prob.squeeze().tolist()
+    index_val = int(prediction.index)
+
+    return {
+        "emotion": emotions.get(index_val, "Unknown"),
+        "label": str(prediction.text_lab),
+        "confidence": round(float(prediction.score), 4),
+        "index": index_val,
+        "probabilities": {
+            emotions[i]: round(probs[i], 4) if i < len(probs) else 0.0
+            for i in range(len(emotions))
+        }
+    }
+
+
+def silent_prediction():
+    return {
+        "emotion": emotions[0],
+        "label": emotion_codes[0],
+        "confidence": 1.0,
+        "index": 0,
+        "probabilities": {
+            emotions[i]: 1.0 if i == 0 else 0.0
+            for i in range(len(emotions))
+        }
+    }
+
+
+def busy_response():
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Emotion analysis is busy, retry shortly"},
+        headers={"Retry-After": EMOTION_RETRY_AFTER}
+    )
+
+
+@app.post("/analyze-emotion/")
+async def analyze_emotion(file: UploadFile = File(...)):
+    inference_backend, scheduler = emotion_runtime()
+
+    with span("emotion", "upload"):
+        data = await file.read()
+
+    # Decode the upload in memory, no temp file round trip
+    try:
+        with span("emotion", "decode"):
+            waveform = await inference_backend.decode(data)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Could not decode audio: {e}")
+
+    with span("emotion", "cache_lookup"):
+        cache_key = await asyncio.to_thread(audio_cache_key, waveform)
+        cached = emotion_cache.get(cache_key)
+    if cached is not None:
+        return JSONResponse(content=cached["result"])
+
+    vad_stats = None
+    if EMOTION_VAD:
+        from vad import trim_silence
+        with span("emotion", "vad"):
+            waveform, vad_stats = await asyncio.to_thread(
+                trim_silence, waveform, inference_backend.sample_rate,
+                silence_db=EMOTION_VAD_SILENCE_DB)
+        if waveform is None:
+            # Nothing to classify; silence reads as neutral
+            result = {**silent_prediction(), "vad": vad_stats}
+            emotion_cache.set(cache_key, {"result": result})
+            return JSONResponse(content=result)
+
+    try:
+        # Predict
+        try:
+            # Queueing plus this request's share of a batch
+            with span("emotion", "inference"):
+                prediction = await scheduler.submit(waveform)
+        except SchedulerBusy:
+            return busy_response()
 
-            mood_data = mood_response.json() if mood_response.status_code == 200 else None
+        result = format_prediction(prediction)
+        if vad_stats is not None:
+            result["vad"] = vad_stats
 
-            # Get watch history (use public endpoint)
+        entry = {"result": result}
+        if EMOTION_CACHE_EMBEDDINGS:
+            entry["embedding"] = prediction.embedding.view(-1).tolist()
+        emotion_cache.set(cache_key, entry)
 
-            watch_url = f"http://localhost:4000/api/watch-history/public/{request.user_id}?limit=20"
+        return JSONResponse(content=result)
 
-            print(f"Fetching watch history from: {watch_url}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Prediction error: {str(e)}")
 
-            watch_response = await client.get(watch_url)
 
-            print(f"Watch response status: {watch_response.status_code}")
+@app.post("/analyze-emotion/timeline")
+async def analyze_emotion_timeline(
+    file: UploadFile = File(...),
+    window: float = 4.0,
+    hop: float = 2.0,
+    stream: bool = True
+):
+    """Per-window emotion timeline for long recordings.
+
+    The clip is cut into ``window``-second windows every ``hop`` seconds and
+    the windows go through the batch scheduler a batch at a time, so encoder
+    memory depends on the window size rather than the clip length. With
+    ``stream`` the segments are sent as NDJSON lines as each batch finishes,
+    followed by a ``summary`` line.
+    """
+    if window <= 0 or hop <= 0:
+        raise HTTPException(
+            status_code=400, detail="window and hop must be positive")
 
-            watch_data = watch_response.json() if watch_response.status_code == 200 else None
+    inference_backend, scheduler = emotion_runtime()
 
-        # Process mood data
-        mood_context = "No mood data available"
-        if mood_data and mood_data.get("aggregatedData"):
-            agg_data = mood_data["aggregatedData"]
-            mood_context = f"""
-            Dominant mood: {agg_data.get('dominantMood', 'Unknown')}
-            Mood distribution: {agg_data.get('moodDistribution', {})}
-            Recent mood trend: {mood_data.get('moodTrend', 'stable')}
-            """
+    with span("emotion_timeline", "upload"):
+        data = await file.read()
 
-        # Process watch history
-        watch_context = "No watch history available"
-        if watch_data and watch_data.get("watchHistory"):
-            history = watch_data["watchHistory"]
-            genres = {}
-            completed_count = 0
+    try:
+        with span("emotion_timeline", "decode"):
+            waveform = await inference_backend.decode(data)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Could not decode audio: {e}")
+
+    if scheduler.pending >= scheduler.max_pending:
+        return busy_response()
+
+    windows = list(iter_windows(
+        waveform, inference_backend.sample_rate, window, hop))
+
+    async def segments():
+        for group in batched(windows, scheduler.max_batch_size):
+            with span("emotion_timeline", "inference"):
+                predictions = await asyncio.gather(
+                    *[scheduler.submit(chunk) for _, _, chunk in group])
+            for (start, end, _), prediction in zip(group, predictions):
+                yield {
+                    "start": round(start, 2),
+                    "end": round(end, 2),
+                    **format_prediction(prediction)
+                }
 
-            for item in history[:10]:  # Last 10 items
-                for genre in item.get("genre", []):
-                    genres[genre] = genres.get(genre, 0) + 1
-                if item.get("completed"):
-                    completed_count += 1
+    def summary(segment_list):
+        probs = aggregate_probabilities(segment_list)
+        index_val = max(range(len(emotions)),
+                        key=lambda i: probs.get(emotions[i], 0.0))
+        return {
+            "emotion": emotions[index_val],
+            "label": emotion_codes[index_val],
+            "confidence": round(probs.get(emotions[index_val], 0.0), 4),
+            "index": index_val,
+            "probabilities": {name: round(p, 4) for name, p in probs.items()},
+            "duration": round(waveform.shape[-1] / inference_backend.sample_rate, 2),
+            "segments": len(segment_list)
+        }
 
-            watch_context = f"""
-            Recently watched genres: {dict(sorted(genres.items(), key=lambda x: x[1], reverse=True)[:5])}
-            Completion rate: {completed_count}/{len(history[:10])} completed
-            Last watched: {history[0].get('title', 'Unknown') if history else 'None'}
-            """
+    if not stream:
+        try:
+            segment_list = [segment async for segment in segments()]
+        except SchedulerBusy:
+            return busy_response()
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Prediction error: {str(e)}")
+        return {"segments": segment_list, "summary": summary(segment_list)}
 
-        # Get current time context
-        current_hour = datetime.now().hour
-        time_context = "morning" if 5 <= current_hour < 12 else \
-            "afternoon" if 12 <= current_hour < 17 else \
-            "evening" if 17 <= current_hour < 22 else "night"
+    async def ndjson():
+        segment_list = []
+        try:
+            async for segment in segments():
+                segment_list.append(segment)
+                yield json.dumps({"type": "segment", **segment}) + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "summary", **summary(segment_list)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def warm_llm_chains():
+    # Imports langchain and builds both chains so the first LLM request
+    # doesn't pay for it
+    import langchain_text_splitters  # noqa: F401 (used by chunk_transcript)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    build_chapter_chain(api_key)
+    build_recommendation_chain(api_key)
+    # Loads tiktoken's encoding, which may download it
+    get_token_counter(CHAPTER_MODEL)
+
+
+llm_chains = LazyComponent("llm_chains", warm_llm_chains)
+
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Per-component load state; 503 until READINESS_REQUIRES are ready."""
+    components = {
+        "http_client": {
+            "state": "ready" if getattr(app.state, "http_client", None)
+            else "pending"
+        },
+        "emotion_model": emotion_model.status(),
+        "llm_chains": llm_chains.status(),
+    }
+    ready = all(components.get(name, {}).get("state") == "ready"
+                for name in READINESS_REQUIRES)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": components,
+                 "startup": STARTUP_PHASES}
+    )
 
-        # Get weather - using regular function instead of tool
-        weather = await get_weather("Delhi")
 
-        # Create recommendation prompt
-        prompt = PromptTemplate(
-            input_variables=["mood_context",
-                             "watch_context", "weather", "time_context"],
-template="""
+@app.get("/debug/memory")
+async def memory_usage():
+    """This worker's memory; with serve.py's preloading, model weights show
+    up as shared_mb rather than uss_mb."""
+    try:
+        memory = process_memory()
+    except OSError as e:
+        raise HTTPException(
+            status_code=501, detail=f"Memory stats unavailable: {e}")
+    return {**memory, "parent_pid": os.getppid(),
+            "emotion_model": emotion_model.state}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Request and per-stage latency histograms, Prometheus text format."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "emotion": emotion_cache.stats(),
+        "transcripts": transcript_cache.stats(),
+        "chapters": chapter_cache.stats(),
+        "weather": weather_cache.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "user_profiles": user_profiles.stats(),
+        "coalescing": {
+            "chapters": generate_chapters.flight.stats(),
+            "recommendations": generate_recommendations.flight.stats(),
+            "recommendation_contexts": recommendation_flight.stats(),
+        },
+    }
+
+
+RECOMMENDATION_PROMPT_TEMPLATE = """
 You are a content recommendation engine that generates search queries.
 
 User Context:
@@ -401,7 +905,7 @@ Generate 7–10 SIMPLE, ONE-WORD search queries for movies/shows.
 
 IMPORTANT RULES:
 - ONLY use words from this array:
-  ["action", "adventure", "comedy", "drama", "thriller", "horror", "romance", "sci-fi", "fantasy", "mystery", "crime", "documentary", "musical", "animation", "war", "western", "historical", "family", "biography", "supernatural", "psychological", "noir", "slasher", "movie", "tv-series", "web-series", "anime", "short-film", "mini-series", "docuseries", "reality-show", "talk-show", "stand-up", "live-performance", "anthology", "ova", "ona", "special", "sports", "school", "slice-of-life", "superhero", "dystopian", "post-apocalyptic", "survival", "cyberpunk", "space", "time-travel", "aliens", "vampires", "zombies", "mythology", "crime-investigation", "political", "legal", "medical", "gaming", "idol", "music", "cooking", "travel", "friendship", "coming-of-age"]
+  """ + json.dumps(ALLOWED_QUERIES) + """
 
 - Use **single words only**
 - Avoid compound terms (e.g., no “sci fi” — use “sci-fi”)
@@ -415,50 +919,286 @@ Output Format — JSON array only:
   {{"query": "thriller", "reason": "evening entertainment", "priority": 6}}
 ]
 """
-        )
 
-        # Generate recommendations
-        llm = ChatOpenAI(
-            model="gpt-4.1-nano",
-            temperature=0.7,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
 
-        chain = LLMChain(llm=llm, prompt=prompt)
+@functools.lru_cache(maxsize=None)
+def build_recommendation_chain(api_key):
+    from langchain.prompts import PromptTemplate
+    from langchain_openai import ChatOpenAI
 
-        # Use invoke instead of run for newer LangChain versions
-        response = chain.invoke({
-            "mood_context": mood_context,
-            "watch_context": watch_context,
-            "weather": weather,
-            "time_context": time_context
-        })
+    prompt = PromptTemplate(
+        input_variables=["mood_context",
+                         "watch_context", "weather", "time_context"],
+        template=RECOMMENDATION_PROMPT_TEMPLATE
+    )
+
+    llm = ChatOpenAI(
+        model="gpt-4.1-nano",
+        temperature=0.7,
+        openai_api_key=api_key
+    )
 
-        # Extract the output text from response
-        response_text = response.get("text", response) if isinstance(
-            response, dict) else str(response)
+    return prompt | llm
 
-        # Parse response
-        try:
-            search_queries = json.loads(response_text)
-            # Sort by priority
-            search_queries.sort(key=lambda x: x.get(
-                "priority", 0), reverse=True)
-        except json.JSONDecodeError:
-            print(f"Failed to parse response: {response_text}")
+
+async def load_weather(location):
+    # wttr.in provides weather data in various formats
+    response = await app.state.http_client.get(
+        f"https://wttr.in/{location}?format=%C+%t",
+        headers={"User-Agent": "curl"}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"wttr.in returned {response.status_code}")
+
+    # Response format: "Cloudy +25°C"
+    weather_text = response.text.strip()
+    return f"Current weather in {location}: {weather_text}"
+
+
+# Weather changes over tens of minutes and every user asks for the same
+# city: serve cached values, refresh stale ones in the background and
+# remember failures so an outage doesn't cost every request a timeout
+weather_cache = AsyncTTLCache(
+    load_weather,
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_CACHE_STALE_TTL", "3600")),
+    error_ttl=float(os.getenv("WEATHER_CACHE_ERROR_TTL", "60")),
+    fallback=lambda location: f"Current weather in {location}: unknown"
+)
+
+
+async def get_weather(location: str = "Delhi") -> str:
+    """Get weather using wttr.in (no API key required)"""
+    return await weather_cache.get(location)
+
+
+# Express API serving mood and watch history
+EXPRESS_API_URL = os.getenv("EXPRESS_API_URL", "http://localhost:4000")
+
+# Per-source budgets; a source that misses its budget is treated as
+# unavailable rather than delaying the whole response
+MOOD_FETCH_TIMEOUT = float(os.getenv("MOOD_FETCH_TIMEOUT", "1.5"))
+WATCH_FETCH_TIMEOUT = float(os.getenv("WATCH_FETCH_TIMEOUT", "1.5"))
+WEATHER_FETCH_TIMEOUT = float(os.getenv("WEATHER_FETCH_TIMEOUT", "2"))
+
+
+async def fetch_json(url, name, timeout):
+    """GET a JSON document, or None on error, non-200 or timeout"""
+    print(f"Fetching {name} from: {url}")
+    try:
+        with span("recommendations", "fetch_" + name.lower().replace(" ", "_")):
+            response = await asyncio.wait_for(
+                app.state.http_client.get(url), timeout)
+    except asyncio.TimeoutError:
+        print(f"{name} fetch timed out after {timeout}s")
+        return None
+    except Exception as e:
+        print(f"{name} fetch error: {e}")
+        return None
+
+    print(f"{name} response status: {response.status_code}")
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json()
+    except ValueError as e:
+        print(f"{name} returned invalid JSON: {e}")
+        return None
+
+
+async def fetch_weather(location="Delhi"):
+    try:
+        with span("recommendations", "weather"):
+            return await asyncio.wait_for(
+                get_weather(location), WEATHER_FETCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Weather fetch timed out after {WEATHER_FETCH_TIMEOUT}s")
+        return f"Current weather in {location}: unknown"
+
+
+async def fetch_user_data(user_id):
+    """Mood history, watch history and weather, fetched concurrently.
+
+    Returns ``(mood_data, watch_data, weather)``; missing sources come back
+    as None (or unknown weather) so the prompt falls back to its
+    "No ... available" text.
+    """
+    return await asyncio.gather(
+        # Get mood history (public endpoint)
+        fetch_json(f"{EXPRESS_API_URL}/api/mood-history/{user_id}",
+                   "Mood", MOOD_FETCH_TIMEOUT),
+        # Get watch history (use public endpoint)
+        fetch_json(f"{EXPRESS_API_URL}/api/watch-history/public/{user_id}?limit=20",
+                   "Watch history", WATCH_FETCH_TIMEOUT),
+        fetch_weather("Delhi"),
+    )
+
+
+# Running per-user aggregates fed by the Express side's watch and mood
+# events, so recommendations don't refetch and recount the histories.
+# Stored in USER_PROFILE_DB, by default the chapter cache file, and in
+# memory if neither is set.
+user_profiles = UserProfileStore(
+    os.getenv("USER_PROFILE_DB", CHAPTER_CACHE_DB) or ":memory:",
+    mood_half_life=float(os.getenv("USER_PROFILE_MOOD_HALF_LIFE_HOURS", "72")) * 3600,
+    max_age=float(os.getenv("USER_PROFILE_MAX_AGE_HOURS", "24")) * 3600,
+)
+USER_PROFILE_MAX_EVENTS = int(os.getenv("USER_PROFILE_MAX_EVENTS", "1000"))
+
+
+async def load_user_context(user_id):
+    """Recommendation context from the user's profile, or from the Express
+    histories (which then seed the profile) if there is none."""
+    profile = user_profiles.get(user_id)
+    if profile is not None:
+        return context_from_summaries(
+            profile["mood"], profile["watch"], await fetch_weather("Delhi"))
+
+    mood_data, watch_data, weather = await fetch_user_data(user_id)
+    # Only complete histories make a profile worth serving from
+    if mood_data is not None and watch_data is not None:
+        user_profiles.seed(user_id, mood_data, watch_data)
+    return build_context(mood_data, watch_data, weather)
+
+
+@app.post("/api/user-profiles/events")
+async def ingest_profile_events(batch: ProfileEventBatch):
+    """Update user profiles with watch and mood events as they happen."""
+    if len(batch.events) > USER_PROFILE_MAX_EVENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {USER_PROFILE_MAX_EVENTS} events per request")
+    events = []
+    for index, event in enumerate(batch.events):
+        if event.type == "mood" and not event.emotion:
             raise HTTPException(
-                status_code=500, detail="Failed to parse AI response")
-
-        return RecommendationResponse(
-            search_queries=search_queries[:request.limit],
-            context={
-                "mood_summary": mood_context,
-                "watch_summary": watch_context,
-                "weather": weather,
-                "time_of_day": time_context
-            },
-            generated_at=datetime.now().isoformat()
-        )
+                status_code=400, detail=f"Event {index}: mood events need an emotion")
+        if event.type == "watch" and not (event.content_id or event.title):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Event {index}: watch events need a content_id or title")
+        events.append({
+            "user_id": event.user_id, "type": event.type,
+            "timestamp": event.timestamp, "content_id": event.content_id,
+            "title": event.title, "genre": event.genre,
+            "completed": event.completed, "emotion": event.emotion,
+        })
+    users = user_profiles.ingest(events)
+    return {"ingested": len(events), "users": users}
+
+
+@app.get("/api/user-profiles/{user_id}")
+async def get_user_profile(user_id: str):
+    profile = user_profiles.get(user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile for this user")
+    return profile
+
+
+# Recommendations depend only on a handful of normalized features, so
+# users with the same context fingerprint share one LLM answer
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "1800"))
+recommendation_cache = LRUCache(
+    int(os.getenv("RECOMMENDATION_CACHE_SIZE", "4096")),
+    ttl=RECOMMENDATION_CACHE_TTL
+)
+recommendation_flight = SingleFlight()
+
+# Seconds the LLM gets before the local recommender answers (0: no limit)
+RECOMMENDATION_LLM_BUDGET = float(os.getenv("RECOMMENDATION_LLM_BUDGET", "4"))
+
+
+async def generate_search_queries(context):
+    # Off the event loop: the first build imports langchain
+    chain = await asyncio.to_thread(
+        build_recommendation_chain, os.getenv("OPENAI_API_KEY"))
+
+    with span("recommendations", "llm"):
+        response = await chain.ainvoke({
+            "mood_context": context["mood_context"],
+            "watch_context": context["watch_context"],
+            "weather": context["weather"],
+            "time_context": context["time_context"]
+        })
+
+    # Extract the output text from response
+    response_text = getattr(response, "content", str(response))
+
+    # Raising here, before anything is cached, lets get_search_queries
+    # answer locally instead of failing the request
+    try:
+        with span("recommendations", "parse"):
+            search_queries = parse_search_queries(response_text)
+            for search_query in search_queries:
+                SearchQuery(**search_query)
+    except ValueError:  # also json.JSONDecodeError and ValidationError
+        print(f"Failed to parse response: {response_text}")
+        raise HTTPException(
+            status_code=500, detail="Failed to parse AI response")
+
+    recommendation_cache.set(context["fingerprint"], search_queries)
+    return search_queries
+
+
+async def get_search_queries(context, budget=RECOMMENDATION_LLM_BUDGET):
+    """Queries for this context and which path served them.
+
+    Returns ``(queries, served_by)`` with ``served_by`` one of "cache",
+    "llm" or "local". The LLM gets ``budget`` seconds (0: no limit); past
+    that, or on failure, the local recommender answers instead while a slow
+    LLM call keeps running to fill the cache for the next request.
+    """
+    search_queries = recommendation_cache.get(context["fingerprint"])
+    if search_queries is not None:
+        return search_queries, "cache"
+    try:
+        search_queries = await asyncio.wait_for(
+            recommendation_flight.do(
+                context["fingerprint"], generate_search_queries, context),
+            budget or None)
+        return search_queries, "llm"
+    except asyncio.TimeoutError:
+        print(f"LLM exceeded {budget}s, "
+              "serving local recommendations")
+    except Exception as e:
+        print(f"LLM recommendations failed, serving local ones: "
+              f"{getattr(e, 'detail', str(e))}")
+    with span("recommendations", "local"):
+        return local_recommendations(context), "local"
+
+
+def recommendation_response(context, search_queries, served_by, limit):
+    return RecommendationResponse(
+        search_queries=search_queries[:limit],
+        context={
+            "mood_summary": context["mood_context"],
+            "watch_summary": context["watch_context"],
+            "weather": context["weather"],
+            "time_of_day": context["time_context"],
+            "fingerprint": context["fingerprint"],
+            "served_by": served_by
+        },
+        generated_at=datetime.now().isoformat()
+    )
+
+
+@app.post("/api/generate-recommendations")
+@coalesce(lambda request: (request.user_id, request.limit))
+async def generate_recommendations(request: RecommendationRequest):
+
+    try:
+
+        print(f"Generating recommendations for user: {request.user_id}")
+
+        # Fetch user data from MongoDB via Express API, and the weather,
+        # all at once
+        with span("recommendations", "user_data"):
+            context = await load_user_context(request.user_id)
+
+        search_queries, served_by = await get_search_queries(context)
+
+        return recommendation_response(
+            context, search_queries, served_by, request.limit)
 
     except Exception as e:
         print(f"Recommendation error: {str(e)}")
@@ -466,3 +1206,78 @@ Output Format — JSON array only:
         traceback.print_exc()
         raise HTTPException(
             status_code=500, detail=f"Failed to generate recommendations: {str(e)}")
+
+
+# Users fetched at once by the batch endpoint, and the most it accepts
+RECOMMENDATION_BATCH_CONCURRENCY = int(
+    os.getenv("RECOMMENDATION_BATCH_CONCURRENCY", "16"))
+RECOMMENDATION_BATCH_MAX_USERS = int(
+    os.getenv("RECOMMENDATION_BATCH_MAX_USERS", "1000"))
+# LLM calls the batch endpoint makes at once, and how long each may take.
+# Batches warm caches rather than answer someone waiting, so they wait for
+# the LLM longer than RECOMMENDATION_LLM_BUDGET before answering locally.
+RECOMMENDATION_BATCH_LLM_CONCURRENCY = int(
+    os.getenv("RECOMMENDATION_BATCH_LLM_CONCURRENCY", "4"))
+RECOMMENDATION_BATCH_LLM_BUDGET = float(
+    os.getenv("RECOMMENDATION_BATCH_LLM_BUDGET", "30"))
+
+
+@app.post("/api/generate-recommendations/batch",
+          response_model=BatchRecommendationResponse)
+async def generate_recommendations_batch(request: BatchRecommendationRequest):
+    """Recommendations for many users, e.g. to warm home-screen rows.
+
+    User data is fetched with bounded concurrency, then users are grouped
+    by context fingerprint so each distinct context costs at most one LLM
+    call, with RECOMMENDATION_BATCH_LLM_CONCURRENCY calls in flight at a
+    time. Failures are reported per user in ``errors``.
+    """
+    user_ids = list(dict.fromkeys(request.user_ids))
+    if len(user_ids) > RECOMMENDATION_BATCH_MAX_USERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {RECOMMENDATION_BATCH_MAX_USERS} users per batch")
+
+    semaphore = asyncio.Semaphore(max(1, RECOMMENDATION_BATCH_CONCURRENCY))
+
+    async def fetch_context(user_id):
+        async with semaphore:
+            return await load_user_context(user_id)
+
+    contexts = await asyncio.gather(
+        *[fetch_context(user_id) for user_id in user_ids],
+        return_exceptions=True)
+
+    results = {}
+    errors = {}
+    groups = {}
+    for user_id, context in zip(user_ids, contexts):
+        if isinstance(context, Exception):
+            errors[user_id] = f"Failed to fetch user data: {str(context)}"
+        else:
+            groups.setdefault(context["fingerprint"], []).append(
+                (user_id, context))
+
+    print(f"Batch recommendations: {len(user_ids)} users, "
+          f"{len(groups)} distinct contexts")
+
+    llm_semaphore = asyncio.Semaphore(
+        max(1, RECOMMENDATION_BATCH_LLM_CONCURRENCY))
+
+    async def serve_group(members):
+        try:
+            async with llm_semaphore:
+                search_queries, served_by = await get_search_queries(
+                    members[0][1], budget=RECOMMENDATION_BATCH_LLM_BUDGET)
+        except Exception as e:
+            detail = getattr(e, "detail", str(e))
+            for user_id, _ in members:
+                errors[user_id] = f"Failed to generate recommendations: {detail}"
+            return
+        for user_id, context in members:
+            results[user_id] = recommendation_response(
+                context, search_queries, served_by, request.limit)
+
+    await asyncio.gather(*[serve_group(members) for members in groups.values()])
+
+    return BatchRecommendationResponse(results=results, errors=errors)
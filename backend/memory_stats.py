@@ -0,0 +1,28 @@
+import os
+
+
+def process_memory(pid="self"):
+    """Memory of one process in MB, from /proc/<pid>/smaps_rollup (Linux).
+
+    ``uss`` (unique set size) is what the process alone costs: pages no
+    other process maps. ``shared`` are pages also mapped elsewhere, e.g.
+    model weights inherited copy-on-write from a preloading parent; ``pss``
+    splits those evenly between the processes sharing them.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "uss_mb": mb("Private_Clean", "Private_Dirty"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+    }
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+
+# The only search queries the frontend knows how to turn into a row
+ALLOWED_QUERIES = (
+    "action", "adventure", "comedy", "drama", "thriller", "horror", "romance",
+    "sci-fi", "fantasy", "mystery", "crime", "documentary", "musical",
+    "animation", "war", "western", "historical", "family", "biography",
+    "supernatural", "psychological", "noir", "slasher", "movie", "tv-series",
+    "web-series", "anime", "short-film", "mini-series", "docuseries",
+    "reality-show", "talk-show", "stand-up", "live-performance", "anthology",
+    "ova", "ona", "special", "sports", "school", "slice-of-life", "superhero",
+    "dystopian", "post-apocalyptic", "survival", "cyberpunk", "space",
+    "time-travel", "aliens", "vampires", "zombies", "mythology",
+    "crime-investigation", "political", "legal", "medical", "gaming", "idol",
+    "music", "cooking", "travel", "friendship", "coming-of-age",
+)
+
+# Rules for the local recommender, most fitting query first
+MOOD_QUERIES = {
+    "happiness": ("comedy", "adventure", "musical", "romance", "animation"),
+    "sadness": ("comedy", "family", "slice-of-life", "friendship", "animation"),
+    "anger": ("action", "sports", "superhero", "stand-up", "thriller"),
+    "neutral": ("drama", "mystery", "documentary", "sci-fi", "crime"),
+}
+MOOD_ALIASES = {
+    "happy": "happiness", "joy": "happiness", "hap": "happiness",
+    "sad": "sadness",
+    "angry": "anger", "ang": "anger",
+    "calm": "neutral", "neu": "neutral",
+}
+GENRE_ALIASES = {
+    "science fiction": "sci-fi", "scifi": "sci-fi", "sci fi": "sci-fi",
+    "animated": "animation", "romantic": "romance", "docu": "documentary",
+    "biopic": "biography", "history": "historical", "music video": "music",
+    "tv series": "tv-series", "series": "tv-series", "kids": "family",
+}
+WEATHER_QUERIES = (
+    (("rain", "drizzle", "shower", "thunder", "storm"),
+     ("romance", "mystery", "drama")),
+    (("snow", "sleet", "blizzard", "ice", "freez"),
+     ("family", "fantasy", "animation")),
+    (("fog", "mist", "haze", "smoke"), ("mystery", "noir", "thriller")),
+    (("sunny", "clear"), ("adventure", "travel", "sports")),
+    (("cloud", "overcast"), ("drama", "documentary", "comedy")),
+)
+TIME_QUERIES = {
+    "morning": ("documentary", "cooking", "slice-of-life"),
+    "afternoon": ("comedy", "animation", "adventure"),
+    "evening": ("drama", "crime", "thriller"),
+    "night": ("thriller", "horror", "sci-fi"),
+}
+
+
+def time_of_day(hour):
+    return "morning" if 5 <= hour < 12 else \
+        "afternoon" if 12 <= hour < 17 else \
+        "evening" if 17 <= hour < 22 else "night"
+
+
+def completion_bucket(completed, total):
+    if not total:
+        return "none"
+    rate = completed / total
+    return "low" if rate < 0.34 else "medium" if rate < 0.67 else "high"
+
+
+def weather_condition(weather):
+    """'Current weather in Delhi: Light rain +25°C' -> 'light rain'"""
+    text = weather.split(":", 1)[-1]
+    text = re.sub(r"[+-]?\d+(\.\d+)?\s*°?[CF]?", " ", text)
+    return " ".join(text.split()).casefold() or "unknown"
+
+
+def normalize_distribution(distribution):
+    """{'Happiness': 3, 'Sadness': 1} -> {'happiness': 0.75, 'sadness': 0.25}"""
+    if not isinstance(distribution, dict):
+        return {}
+    weights = {}
+    for mood, weight in distribution.items():
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            continue
+        if weight > 0:
+            mood = str(mood).strip().casefold()
+            weights[mood] = weights.get(mood, 0) + weight
+    total = sum(weights.values())
+    return {mood: weight / total for mood, weight in weights.items()} \
+        if total else {}
+
+
+def mood_summary(mood_data):
+    """Dominant mood, distribution and trend from the Express mood history"""
+    if not (mood_data and mood_data.get("aggregatedData")):
+        return None
+    agg_data = mood_data["aggregatedData"]
+    return {
+        "dominant": agg_data.get("dominantMood"),
+        "distribution": agg_data.get("moodDistribution", {}),
+        "trend": mood_data.get("moodTrend", "stable"),
+    }
+
+
+def watch_summary(watch_data, window=10):
+    """Genre counts, completions and last title over the latest ``window``
+    items of the Express watch history"""
+    if not (watch_data and watch_data.get("watchHistory")):
+        return None
+    history = watch_data["watchHistory"]
+    recent = history[:window]
+    genres = {}
+    completed_count = 0
+
+    for item in recent:
+        for genre in item.get("genre", []):
+            genres[genre] = genres.get(genre, 0) + 1
+        if item.get("completed"):
+            completed_count += 1
+
+    return {
+        "genres": sorted(genres.items(), key=lambda x: x[1], reverse=True)[:5],
+        "completed": completed_count,
+        "total": len(recent),
+        "last_title": history[0].get("title", "Unknown"),
+    }
+
+
+def build_context(mood_data, watch_data, weather, now=None):
+    """Prompt inputs for one user plus the normalized features they boil
+    down to. Users with equal ``features`` share a ``fingerprint`` and can
+    be served the same recommendations.
+    """
+    return context_from_summaries(
+        mood_summary(mood_data), watch_summary(watch_data), weather, now)
+
+
+def context_from_summaries(mood, watch, weather, now=None):
+    """build_context from ``mood_summary``/``watch_summary`` shaped dicts,
+    e.g. the ones a user profile keeps up to date."""
+    now = now or datetime.now()
+
+    # Process mood data
+    mood_context = "No mood data available"
+    dominant_mood = None
+    mood_distribution = {}
+    if mood:
+        dominant_mood = mood.get("dominant")
+        mood_distribution = normalize_distribution(mood.get("distribution"))
+        mood_context = f"""
+            Dominant mood: {dominant_mood or 'Unknown'}
+            Mood distribution: {mood.get('distribution') or {}}
+            Recent mood trend: {mood.get('trend') or 'stable'}
+            """
+
+    # Process watch history
+    watch_context = "No watch history available"
+    top_genres = []
+    completed_count = 0
+    total = 0
+    if watch:
+        ranked = [tuple(pair) for pair in watch["genres"]]
+        top_genres = [genre for genre, _ in ranked]
+        completed_count = watch["completed"]
+        total = watch["total"]
+        watch_context = f"""
+            Recently watched genres: {dict(ranked)}
+            Completion rate: {completed_count}/{total} completed
+            Last watched: {watch.get('last_title') or 'None'}
+            """
+
+    time_context = time_of_day(now.hour)
+
+    features = {
+        "mood": str(dominant_mood).strip().casefold() if dominant_mood else None,
+        # Order within the top three matters less than which genres they are
+        "genres": sorted(str(g).strip().casefold() for g in top_genres[:3]),
+        "completion": completion_bucket(completed_count, total),
+        "weather": weather_condition(weather),
+        "time_of_day": time_context,
+    }
+    fingerprint = hashlib.sha256(
+        json.dumps(features, sort_keys=True).encode()).hexdigest()[:32]
+
+    return {
+        "mood_context": mood_context,
+        "watch_context": watch_context,
+        "weather": weather,
+        "time_context": time_context,
+        "features": features,
+        "fingerprint": fingerprint,
+        # Inputs for the local recommender beyond the features
+        "mood_distribution": mood_distribution,
+        "top_genres": top_genres,
+    }
+
+
+def clean_search_query(item):
+    """``{"query", "reason", "priority"}`` from one model item, or None if
+    the query isn't in ALLOWED_QUERIES or a field has the wrong type."""
+    if not isinstance(item, dict):
+        return None
+    query = item.get("query")
+    reason = item.get("reason")
+    priority = item.get("priority")
+    if not isinstance(query, str) or not isinstance(reason, str):
+        return None
+    if isinstance(priority, bool) or not isinstance(priority, (int, float)) \
+            or priority != priority:
+        return None
+    query = query.strip().casefold()
+    if query not in ALLOWED_QUERIES:
+        return None
+    return {"query": query, "reason": reason.strip(), "priority": int(priority)}
+
+
+def parse_search_queries(response_text):
+    """Parse the model's JSON array, highest priority first.
+
+    Unusable items are dropped (and repeated queries kept once); raises
+    ValueError if nothing usable is left, so a bad answer is never cached.
+    """
+    items = json.loads(response_text)
+    if not isinstance(items, list):
+        raise json.JSONDecodeError("Expected a JSON array", response_text, 0)
+    search_queries = []
+    seen = set()
+    for item in items:
+        query = clean_search_query(item)
+        if query is not None and query["query"] not in seen:
+            seen.add(query["query"])
+            search_queries.append(query)
+    if not search_queries:
+        raise ValueError("No usable search queries in the AI response")
+    search_queries.sort(key=lambda x: x["priority"], reverse=True)
+    return search_queries
+
+
+def to_query(genre):
+    """Map a watch-history genre onto ALLOWED_QUERIES, or None"""
+    name = " ".join(str(genre).casefold().replace("_", " ").split())
+    name = GENRE_ALIASES.get(name, name)
+    name = name.replace(" ", "-")
+    return name if name in ALLOWED_QUERIES else None
+
+
+def local_recommendations(context, count=8):
+    """Deterministic search queries from mood, genres, weather and time.
+
+    Used when the LLM is slow or failing; each signal adds weight to the
+    queries its rules list, earlier entries weighing more.
+    """
+    scores = {}
+    reasons = {}
+
+    def vote(queries, weight, reason):
+        for rank, query in enumerate(queries):
+            score = weight / (1 + 0.25 * rank)
+            scores[query] = scores.get(query, 0) + score
+            if score > reasons.get(query, (0, ""))[0]:
+                reasons[query] = (score, reason)
+
+    moods = context.get("mood_distribution") or {}
+    if not moods and context["features"]["mood"]:
+        moods = {context["features"]["mood"]: 1.0}
+    for mood, weight in moods.items():
+        mood = MOOD_ALIASES.get(mood, mood)
+        if mood in MOOD_QUERIES:
+            vote(MOOD_QUERIES[mood], 3 * weight, f"fits a {mood} mood")
+
+    for rank, genre in enumerate(context.get("top_genres") or []):
+        query = to_query(genre)
+        if query:
+            vote([query], 2.5 / (1 + 0.5 * rank), "you watch a lot of it")
+
+    condition = context["features"]["weather"]
+    for keywords, queries in WEATHER_QUERIES:
+        if any(keyword in condition for keyword in keywords):
+            vote(queries, 1.0, f"{condition} weather")
+            break
+
+    time_context = context["features"]["time_of_day"]
+    vote(TIME_QUERIES.get(time_context, ()), 1.0, f"{time_context} viewing")
+
+    if not scores:
+        vote(("movie", "tv-series", "comedy", "drama"), 1.0, "popular pick")
+
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:count]
+    top = ranked[0][1]
+    return [
+        {"query": query, "reason": reasons[query][1],
+         "priority": max(1, round(10 * score / top))}
+        for query, score in ranked
+    ]
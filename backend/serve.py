@@ -0,0 +1,159 @@
+"""Run the API on several workers that share one copy of the model.
+
+    python serve.py --workers 4 --port 8000
+
+``uvicorn --workers`` starts fresh interpreters that each load their own
+wav2vec2 weights. Here the parent loads the model once, freezes the garbage
+collector and forks the workers; the weights are only read, so every worker
+maps the same physical pages copy-on-write and costs only its private
+memory. Unless EMOTION_TORCH_THREADS is set, the CPU cores are split
+between the workers for torch's intra-op threads. The parent restarts
+workers that die, prints a per-worker memory
+report (RSS, PSS and unique USS) shortly after startup and on SIGUSR1, and
+stops the workers on SIGINT/SIGTERM.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Add current directory to path
+sys.path.insert(0, '.')
+
+from memory_stats import process_memory
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--no-preload", action="store_true",
+                        help="let each worker load its own model")
+    parser.add_argument("--report-after", type=int, default=30,
+                        help="seconds until the first memory report (0: off)")
+    return parser.parse_args()
+
+
+def bind_socket(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def split_torch_threads(workers):
+    """Default EMOTION_TORCH_THREADS to this worker's share of the cores"""
+    if os.getenv("EMOTION_TORCH_THREADS"):
+        return
+    # The setting is per emotion worker, and every server worker runs
+    # EMOTION_WORKERS of them
+    backends = max(1, workers) * max(1, int(os.getenv("EMOTION_WORKERS", "1")))
+    threads = max(1, (os.cpu_count() or 1) // backends)
+    os.environ["EMOTION_TORCH_THREADS"] = str(threads)
+    print(f"Using {threads} torch threads per emotion worker")
+
+
+def preload():
+    if os.getenv("EMOTION_BACKEND", "thread") != "thread":
+        print("EMOTION_BACKEND is not 'thread', not preloading the model")
+        return
+    started = time.perf_counter()
+    from inference_backend import preload_classifier
+    preload_classifier(source=".", hparams_file="hyperparams.yaml")
+    # Objects that exist now are never collected; keeping the collector
+    # off them stops it from dirtying their pages in every worker
+    gc.collect()
+    gc.freeze()
+    # The workers' backends pick the preloaded model up immediately
+    os.environ.setdefault("EMOTION_MODEL_LOAD", "eager")
+    print(f"Preloaded emotion model in {time.perf_counter() - started:.1f}s")
+
+
+def run_worker(sock):
+    import uvicorn
+
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1,
+                   signal.SIGALRM):
+        signal.signal(signum, signal.SIG_DFL)
+    # main is imported here, not in the parent: it opens SQLite caches and
+    # an HTTP client, neither of which may be shared across fork
+    server = uvicorn.Server(uvicorn.Config("main:app", lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def memory_report(workers):
+    print(f"{'pid':>8} {'rss_mb':>8} {'pss_mb':>8} {'uss_mb':>8} {'shared_mb':>9}")
+    for label, pid in [("parent", os.getpid())] + [("worker", p) for p in workers]:
+        try:
+            mem = process_memory(pid)
+        except OSError as e:
+            print(f"{pid:8d} unavailable: {e}")
+            continue
+        print(f"{pid:8d} {mem['rss_mb']:8.1f} {mem['pss_mb']:8.1f} "
+              f"{mem['uss_mb']:8.1f} {mem['shared_mb']:9.1f}  {label}")
+    sys.stdout.flush()
+
+
+def main():
+    args = parse_args()
+    sock = bind_socket(args.host, args.port)
+    split_torch_threads(args.workers)
+    if not args.no_preload:
+        preload()
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, lambda *_: memory_report(workers))
+    signal.signal(signal.SIGALRM, lambda *_: memory_report(workers))
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    print(f"Serving on {args.host}:{args.port} with {len(workers)} workers")
+    if args.report_after > 0:
+        signal.alarm(args.report_after)
+
+    while workers:
+        pid, status = os.wait()
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {status}, restarting")
+        # Don't spin if workers die right away (e.g. the app fails to import)
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        spawn()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import functools
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and get the same result or exception.
+    The task is shielded, so one caller disconnecting doesn't cancel the
+    work for everyone else.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Nobody may be left to retrieve the exception
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+def coalesce(key_fn):
+    """Decorator for async functions: concurrent calls for which ``key_fn``
+    (called with the same arguments) returns equal keys share one run."""
+    def decorator(fn):
+        flight = SingleFlight()
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await flight.do(key_fn(*args, **kwargs), fn, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+    return decorator
@@ -0,0 +1,25 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cache_store import TieredCache  # noqa: E402
+
+
+def test_disk_hits_keep_their_remaining_ttl(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = TieredCache(path=path, ttl=3600)
+    writer.set("soon", "value", ttl=0.2)
+    writer.set("forever", "value", ttl=0)
+
+    # A fresh process only has the disk tier to go on
+    reader = TieredCache(path=path, ttl=3600)
+    assert reader.get("soon") == "value"
+    assert reader.get("forever") == "value"
+    assert reader.memory._data["forever"][1] is None
+
+    time.sleep(0.3)
+    assert reader.get("soon") is None
+    writer.close()
+    reader.close()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from chapter_jobs import ChapterJobQueue  # noqa: E402
+
+
+class CountingProcess:
+    """Records how often each video is processed; takes ``delay`` seconds."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = {}
+
+    async def __call__(self, video_id, mode):
+        self.calls[video_id] = self.calls.get(video_id, 0) + 1
+        await asyncio.sleep(self.delay)
+        return {"video_id": video_id}
+
+
+def test_shared_database_runs_each_job_once(tmp_path):
+    # Two queues on one file stand in for two server workers
+    path = str(tmp_path / "jobs.sqlite3")
+    process = CountingProcess()
+
+    async def run():
+        first = ChapterJobQueue(path, process, lease=0.6)
+        second = ChapterJobQueue(path, process, lease=0.6)
+        jobs = [first.submit(f"v{i}", "local")[0] for i in range(6)]
+        first.start()
+        # A second worker starting up must not take over running jobs
+        await asyncio.sleep(0.05)
+        second.start()
+        results = [await second.wait(job["id"], 10, poll_interval=0.05)
+                   for job in jobs]
+        await first.stop()
+        await second.stop()
+        first.close()
+        second.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [job["status"] for job in results] == ["done"] * 6
+    assert process.calls == {f"v{i}": 1 for i in range(6)}
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    process = CountingProcess(delay=0)
+
+    async def run():
+        queue = ChapterJobQueue(path, process, lease=0.3)
+        job, _ = queue.submit("v1", "local")
+        # Claimed by a worker that died, its lease long expired
+        queue._execute(
+            "UPDATE chapter_jobs SET status = 'running', attempts = 1,"
+            " owner = 'gone', lease_until = ? WHERE id = ?",
+            (time.time() - 1, job["id"]))
+        live, _ = queue.submit("v2", "local")
+        queue._execute(
+            "UPDATE chapter_jobs SET status = 'running', attempts = 1,"
+            " owner = 'alive', lease_until = ? WHERE id = ?",
+            (time.time() + 60, live["id"]))
+        queue._pending.clear()
+        queue.start()
+        reclaimed = await queue.wait(job["id"], 5, poll_interval=0.05)
+        untouched = queue.get(live["id"])
+        await queue.stop()
+        queue.close()
+        return reclaimed, untouched
+
+    reclaimed, untouched = asyncio.run(run())
+    assert reclaimed["status"] == "done"
+    assert reclaimed["attempts"] == 2
+    assert untouched["status"] == "running"
+    assert untouched["owner"] == "alive"
+    assert process.calls == {"v1": 1}
+
+
+def test_wait_does_not_keep_waiters(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def run():
+        queue = ChapterJobQueue(path, CountingProcess(delay=0.1))
+        queue.start()
+        job, _ = queue.submit("v1", "local")
+        waits = [queue.wait(job["id"], 5) for _ in range(3)]
+        results = await asyncio.gather(*waits, queue.wait("missing", 1))
+        # Finished and unknown jobs return without registering a waiter
+        await queue.wait(job["id"], 1)
+        await queue.stop()
+        queue.close()
+        return results, queue._waiters
+
+    results, waiters = asyncio.run(run())
+    assert [job["status"] for job in results[:3]] == ["done"] * 3
+    assert results[3] is None
+    assert waiters == {}
+
+
+def test_concurrent_submits_add_one_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queues = [ChapterJobQueue(path, CountingProcess()) for _ in range(4)]
+
+    with ThreadPoolExecutor(len(queues)) as pool:
+        results = list(pool.map(
+            lambda queue: queue.submit("v1", "local"), queues * 5))
+
+    assert len({job["id"] for job, _ in results}) == 1
+    assert sum(not deduplicated for _, deduplicated in results) == 1
+    for queue in queues:
+        queue.close()
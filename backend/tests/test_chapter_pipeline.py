@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from chapter_pipeline import (  # noqa: E402
+    ChapterGenerationError, generate_chapters_map_reduce, stream_chapters)
+
+
+class FakeStreamingChain:
+    """Streams a chapter per chunk, a few characters at a time."""
+
+    def __init__(self, fail_batches=()):
+        self.fail_batches = set(fail_batches)
+        self.calls = 0
+
+    async def astream(self, inputs):
+        chunks = json.loads(inputs["transcript_chunks"])
+        batch = self.calls
+        self.calls += 1
+        if batch in self.fail_batches:
+            raise RuntimeError("rate limited")
+        text = json.dumps([
+            {"start": c["start"], "end": c["end"], "title": f"Topic {c['start']:g}"}
+            for c in chunks
+        ])
+        for i in range(0, len(text), 7):
+            await asyncio.sleep(0)
+            yield text[i:i + 7]
+
+
+def make_chunks(n):
+    return [{"start": 10.0 * i, "end": 10.0 * (i + 1), "text": "word " * 40}
+            for i in range(n)]
+
+
+async def collect(chain, chunked, **kwargs):
+    return [event async for event in stream_chapters(
+        chain, chunked, model="gpt-4.1-nano", **kwargs)]
+
+
+def test_stream_chapters_yields_chapters_and_summary():
+    events = asyncio.run(collect(FakeStreamingChain(), make_chunks(6),
+                                 max_tokens=150, concurrency=2))
+
+    chapters = [e for e in events if e["type"] == "chapter"]
+    summary = events[-1]
+    assert not [e for e in events if e["type"] == "error"]
+    assert len(chapters) == 6
+    assert summary["type"] == "summary"
+    assert summary["batches"] > 1
+    assert summary["failed_batches"] == []
+    assert [c["start"] for c in summary["chapters"]] == [0, 10, 20, 30, 40, 50]
+
+
+def test_stream_chapters_reports_failed_batches():
+    events = asyncio.run(collect(FakeStreamingChain(fail_batches={0}),
+                                 make_chunks(6), max_tokens=150, concurrency=1))
+
+    errors = [e for e in events if e["type"] == "error"]
+    summary = events[-1]
+    assert [e["batch"] for e in errors] == [0]
+    assert summary["failed_batches"] == [0]
+    assert summary["chapters"]
+
+
+class FakeChain:
+    """ainvoke version of FakeStreamingChain that records finished batches."""
+
+    def __init__(self, fail_batches=()):
+        self.fail_batches = set(fail_batches)
+        self.calls = 0
+        self.finished = 0
+
+    async def ainvoke(self, inputs):
+        chunks = json.loads(inputs["transcript_chunks"])
+        batch = self.calls
+        self.calls += 1
+        if batch in self.fail_batches:
+            raise RuntimeError("rate limited")
+        await asyncio.sleep(0.05)
+        self.finished += 1
+        return json.dumps([
+            {"start": c["start"], "end": c["end"], "title": f"Topic {c['start']:g}"}
+            for c in chunks
+        ])
+
+
+def test_map_reduce_cancels_other_batches_on_failure():
+    chain = FakeChain(fail_batches={0})
+
+    async def run():
+        with pytest.raises(ChapterGenerationError):
+            await generate_chapters_map_reduce(
+                chain, make_chunks(6), model="gpt-4.1-nano", max_tokens=150,
+                concurrency=6)
+        # Give cancelled batches the time they would have needed
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert chain.calls > 1
+    assert chain.finished == 0
+
+
+def test_token_counter_retries_after_tiktoken_fails(monkeypatch):
+    import chapter_pipeline
+
+    class Encoding:
+        def encode(self, text):
+            return text.split()
+
+    def unavailable(model):
+        raise OSError("no network")
+
+    monkeypatch.setattr(chapter_pipeline.tiktoken, "encoding_for_model", unavailable)
+    counter = chapter_pipeline.get_token_counter("test-model")
+    assert counter("one two three four") == len("one two three four") // 4 + 1
+
+    monkeypatch.setattr(chapter_pipeline, "TOKEN_COUNTER_RETRY", 0)
+    monkeypatch.setattr(chapter_pipeline.tiktoken, "encoding_for_model",
+                        lambda model: Encoding())
+    counter = chapter_pipeline.get_token_counter("test-model")
+    assert counter("one two three four") == 4
+    chapter_pipeline._token_counters.pop("test-model")
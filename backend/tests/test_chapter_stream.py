@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+
+TOPICS = [
+    "volcano magma eruption crater basalt lava ash tectonic".split(),
+    "bread flour yeast dough oven knead crust sourdough".split(),
+]
+
+
+class FailingChain:
+    async def astream(self, inputs):
+        raise RuntimeError("rate limited")
+        yield
+
+
+def make_transcript():
+    cleaned = []
+    for index in range(300):
+        words = TOPICS[index // 150]
+        text = " ".join(words[(index + i) % len(words)] for i in range(8))
+        cleaned.append({"start": 4.0 * index, "end": 4.0 * index + 4, "text": text})
+    return cleaned
+
+
+def read_events(response):
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+
+    events = []
+    for chunk in asyncio.run(collect()):
+        event, data = chunk.strip().split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def stream(video_id, mode):
+    request = main.VideoChapterRequest(video_id=video_id, mode=mode)
+    return read_events(asyncio.run(main.generate_chapters_stream(request)))
+
+
+def test_auto_mode_falls_back_to_local_chapters(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(main, "build_chapter_chain", lambda api_key: FailingChain())
+
+    async def transcript(video_id):
+        return make_transcript()
+
+    monkeypatch.setattr(main, "get_cleaned_transcript", transcript)
+
+    events = stream("stream-fallback", "auto")
+
+    kinds = [kind for kind, _ in events]
+    assert "error" in kinds
+    summary = events[-1][1]
+    assert kinds[-1] == "summary"
+    assert summary["engine"] == "local"
+    assert len(summary["chapters"]) >= 2
+    assert [data for kind, data in events if kind == "chapter"] == summary["chapters"]
+
+
+def test_no_captions_is_sent_as_events(monkeypatch):
+    async def transcript(video_id):
+        raise main.NoCaptionsError("Subtitles are disabled")
+
+    monkeypatch.setattr(main, "get_cleaned_transcript", transcript)
+
+    events = stream("stream-no-captions", "local")
+
+    assert [kind for kind, _ in events] == ["error", "summary"]
+    assert events[0][1]["error_type"] == "no_captions"
+    assert events[1][1]["chapters"] == []
+    assert events[1][1]["error_type"] == "no_captions"
+
+
+def test_stream_times_its_stages(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(main, "build_chapter_chain", lambda api_key: FailingChain())
+
+    async def transcript(video_id):
+        return make_transcript()
+
+    monkeypatch.setattr(main, "get_cleaned_transcript", transcript)
+
+    stream("stream-spans", "llm")
+
+    rendered = main.REGISTRY.render()
+    for stage in ("cache_lookup", "transcript_fetch", "chunking", "llm"):
+        assert f'route="chapters_stream",stage="{stage}"' in rendered
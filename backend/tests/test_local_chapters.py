@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from local_chapters import segment_transcript  # noqa: E402
+
+TOPICS = [
+    "volcano magma eruption crater basalt lava ash tectonic".split(),
+    "bread flour yeast dough oven knead crust sourdough".split(),
+    "galaxy telescope nebula orbit planet comet stellar cosmic".split(),
+]
+
+
+def make_transcript(topic_seconds=600, seed=0):
+    rng = random.Random(seed)
+    cleaned = []
+    t = 0.0
+    for words in TOPICS:
+        end = t + topic_seconds
+        while t < end:
+            text = " ".join(rng.choice(words) for _ in range(8))
+            cleaned.append({"start": t, "end": t + 4, "text": text})
+            t += 4
+    return cleaned
+
+
+def test_segments_at_topic_changes():
+    chapters = segment_transcript(make_transcript())
+
+    starts = [c["start"] for c in chapters]
+    assert len(chapters) == 3
+    assert starts[0] == 0
+    assert abs(starts[1] - 600) <= 60
+    assert abs(starts[2] - 1200) <= 60
+    assert "Volcano" in chapters[0]["title"] or "Magma" in chapters[0]["title"]
+    assert all(c["end"] > c["start"] for c in chapters)
+
+
+def test_empty_and_wordless_transcripts():
+    assert segment_transcript([]) == []
+    chapters = segment_transcript([{"start": 0, "end": 4, "text": "um uh"}])
+    assert chapters == [{"start": 0, "end": 4, "title": "Full Video"}]
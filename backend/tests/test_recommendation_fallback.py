@@ -0,0 +1,29 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+from recommendations import build_context  # noqa: E402
+
+
+class FakeChain:
+    def __init__(self, text):
+        self.text = text
+
+    async def ainvoke(self, inputs):
+        return self.text
+
+
+def test_unusable_llm_answer_falls_back_to_local(monkeypatch):
+    monkeypatch.setattr(main, "build_recommendation_chain",
+                        lambda api_key: FakeChain('[{"query": "action", "priority": 9}]'))
+    context = build_context(None, None, "Current weather in Delhi: Sunny +30°C")
+
+    search_queries, served_by = asyncio.run(main.get_search_queries(context))
+
+    assert served_by == "local"
+    assert search_queries
+    assert main.recommendation_cache.get(context["fingerprint"]) is None
+    main.recommendation_response(context, search_queries, served_by, 10)
@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recommendations import parse_search_queries  # noqa: E402
+
+
+def test_parse_search_queries_drops_unusable_items():
+    response = json.dumps([
+        {"query": "comedy", "reason": "mood boost", "priority": 7},
+        {"query": "action", "priority": 9},                      # no reason
+        {"query": "space opera", "reason": "x", "priority": 8},  # not allowed
+        {"query": "Drama ", "reason": "evening", "priority": 8.0},
+        {"query": "thriller", "reason": "night", "priority": "high"},
+        {"query": "comedy", "reason": "again", "priority": 1},
+        "horror",
+    ])
+
+    assert parse_search_queries(response) == [
+        {"query": "drama", "reason": "evening", "priority": 8},
+        {"query": "comedy", "reason": "mood boost", "priority": 7},
+    ]
+
+
+def test_parse_search_queries_rejects_answers_without_usable_items():
+    with pytest.raises(ValueError):
+        parse_search_queries(json.dumps([{"query": "space opera"}]))
+    with pytest.raises(ValueError):
+        parse_search_queries('{"query": "comedy"}')
+    with pytest.raises(ValueError):
+        parse_search_queries("not json")
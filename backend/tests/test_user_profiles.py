@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recommendations import watch_summary  # noqa: E402
+from user_profiles import UserProfileStore  # noqa: E402
+
+
+def history(now):
+    """Express watch history, newest first, with one title watched twice"""
+    items = [
+        ("c1", "One", ["Drama"], True),
+        ("c2", "Two", ["Comedy"], False),
+        ("c1", "One", ["Drama"], True),
+        ("c3", "Three", ["Action", "Drama"], False),
+    ]
+    return {"watchHistory": [
+        {"contentId": content_id, "title": title, "genre": genre,
+         "completed": completed, "watchedAt": now - 60 * index}
+        for index, (content_id, title, genre, completed) in enumerate(items)
+    ]}
+
+
+def test_seeded_profile_counts_history_like_watch_summary():
+    store = UserProfileStore(":memory:")
+    watch_data = history(time.time())
+    store.seed("u1", {"moods": [{"emotion": "Happiness"}]}, watch_data)
+
+    profile = store.get("u1")
+    expected = watch_summary(watch_data)
+    assert profile["watch"]["completed"] == expected["completed"] == 2
+    assert profile["watch"]["total"] == expected["total"] == 4
+    assert [tuple(pair) for pair in profile["watch"]["genres"]] \
+        == expected["genres"]
+
+
+def test_events_before_seeding_do_not_hide_the_history():
+    store = UserProfileStore(":memory:")
+    now = time.time()
+    store.ingest([
+        # Already in the Express mood history below
+        {"user_id": "u1", "type": "mood", "emotion": "Sadness",
+         "timestamp": now - 30},
+        {"user_id": "u1", "type": "watch", "content_id": "c9", "title": "New",
+         "genre": ["Horror"], "completed": False, "timestamp": now},
+    ])
+    assert store.get("u1") is None
+
+    store.seed("u1", {"moods": [
+        {"emotion": "Happiness", "timestamp": now - 600},
+        {"emotion": "Sadness", "timestamp": now - 30},
+    ]}, history(now - 1))
+
+    profile = store.get("u1")
+    assert profile["watch"]["total"] == 5
+    assert profile["watch"]["last_title"] == "New"
+    assert set(profile["mood"]["distribution"]) == {"Happiness", "Sadness"}
+    assert profile["mood"]["distribution"]["Sadness"] < 55
+
+    # Seeded now: later seeds leave it alone and events apply directly
+    store.seed("u1", {"moods": [{"emotion": "Anger"}]}, {"watchHistory": []})
+    store.ingest([{"user_id": "u1", "type": "mood", "emotion": "Neutral"}])
+    profile = store.get("u1")
+    assert "Anger" not in profile["mood"]["distribution"]
+    assert "Neutral" in profile["mood"]["distribution"]
+
+
+def test_events_do_not_revive_an_expired_profile():
+    store = UserProfileStore(":memory:", max_age=60)
+    now = time.time()
+    store.seed("u1", {"moods": [{"emotion": "Sadness"}]}, {"watchHistory": [
+        {"contentId": "c1", "title": "Old", "genre": ["Drama"]}]})
+    # Seeded long enough ago that the feed may have stopped since
+    store._db.execute("UPDATE user_profiles SET updated = ?", (now - 120,))
+
+    store.ingest([{"user_id": "u1", "type": "mood", "emotion": "Happiness"}])
+    assert store.get("u1") is None
+
+    store.seed("u1", {"moods": [{"emotion": "Neutral"}]}, {"watchHistory": [
+        {"contentId": "c2", "title": "Fresh", "genre": ["Comedy"]}]})
+    profile = store.get("u1")
+    assert profile["watch"]["last_title"] == "Fresh"
+    assert set(profile["mood"]["distribution"]) == {"Neutral", "Happiness"}
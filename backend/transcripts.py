@@ -0,0 +1,66 @@
+from bisect import bisect_right
+
+
+def clean_transcript(raw_transcript):
+    cleaned = []
+    for entry in raw_transcript:
+        start = round(entry["start"], 2)
+        end = round(entry["start"] + entry["duration"], 2)
+        text = entry["text"].strip()
+        if text:
+            cleaned.append({
+                "start": start,
+                "end": end,
+                "text": text
+            })
+    return cleaned
+
+
+def chunk_transcript(cleaned_transcript, chunk_size=500, chunk_overlap=50):
+    # Imported on first use; pulling in langchain slows down app startup
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    full_text = " ".join([entry["text"] for entry in cleaned_transcript])
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False,
+    )
+
+    chunks = splitter.split_text(full_text)
+
+    # Character offset where each entry starts in full_text (entries are
+    # joined with a single space)
+    entry_starts = []
+    offset = 0
+    for entry in cleaned_transcript:
+        entry_starts.append(offset)
+        offset += len(entry["text"]) + 1
+
+    # Chunks come out in order but overlap, so each chunk starts after the
+    # previous chunk's start and usually within chunk_overlap of its end.
+    # Searching forward from there finds its true offset in linear time
+    # overall, and bisect maps offsets to entries.
+    chunked_output = []
+    search_from = 0
+    for chunk in chunks:
+        text = chunk.strip()
+        chunk_start_idx = full_text.find(text, search_from)
+        if chunk_start_idx == -1:
+            # Splitter altered the text; fall back to the running position
+            chunk_start_idx = min(search_from, max(len(full_text) - 1, 0))
+        chunk_end_idx = chunk_start_idx + max(len(text) - 1, 0)
+        search_from = chunk_start_idx + 1
+
+        first = max(bisect_right(entry_starts, chunk_start_idx) - 1, 0)
+        last = max(bisect_right(entry_starts, chunk_end_idx) - 1, first)
+
+        chunked_output.append({
+            "start": round(cleaned_transcript[first]["start"], 2),
+            "end": round(cleaned_transcript[last]["end"], 2),
+            "text": text
+        })
+
+    return chunked_output
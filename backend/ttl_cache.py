@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+
+class AsyncTTLCache:
+    """Per-key cache around an async ``loader`` with stale-while-revalidate.
+
+    Fresh values (younger than ``ttl``) are returned directly. Values up to
+    ``stale_ttl`` old are returned immediately while a background task
+    refreshes them. When the loader fails, the key is negatively cached for
+    ``error_ttl`` seconds: callers get the last good value if there is one,
+    otherwise ``fallback(key)``, without retrying the loader on every call.
+    Concurrent loads of the same key share one loader call.
+    """
+
+    def __init__(self, loader, ttl, stale_ttl=None, error_ttl=60.0,
+                 fallback=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl or ttl, ttl)
+        self.error_ttl = error_ttl
+        self.fallback = fallback or (lambda key: None)
+        self._entries = {}
+        self._errors = {}
+        self._loading = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def get(self, key):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        failing = self._errors.get(key, 0) > now
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                if not failing and key not in self._loading:
+                    self.refreshes += 1
+                    self._start_load(key)
+                return value
+
+        if failing:
+            self.negative_hits += 1
+            return self.fallback(key)
+
+        self.misses += 1
+        task = self._loading.get(key) or self._start_load(key)
+        # Shielded so a caller timing out doesn't cancel the load for others
+        return await asyncio.shield(task)
+
+    def _start_load(self, key):
+        task = asyncio.ensure_future(self._load(key))
+        self._loading[key] = task
+        task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return task
+
+    async def _load(self, key):
+        try:
+            value = await self.loader(key)
+        except Exception as e:
+            print(f"Refreshing {key!r} failed: {e}")
+            self._errors[key] = time.monotonic() + self.error_ttl
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.stale_ttl:
+                return entry[0]
+            return self.fallback(key)
+
+        self._entries[key] = (value, time.monotonic())
+        self._errors.pop(key, None)
+        return value
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
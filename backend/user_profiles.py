@@ -0,0 +1,330 @@
+import bisect
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Scores the Express side uses for its mood trend
+MOOD_VALUES = {"Happiness": 2, "Neutral": 0, "Sadness": -1, "Anger": -2}
+
+
+def to_timestamp(value):
+    """Epoch seconds from a number, datetime or ISO string; now if missing"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return value.timestamp()
+    except (AttributeError, ValueError):
+        return time.time()
+
+
+def mood_trend(emotions):
+    """'improving', 'declining' or 'stable', as the Express side computes it"""
+    trend = 0
+    for previous, current in zip(emotions, emotions[1:]):
+        trend += MOOD_VALUES.get(current, 0) - MOOD_VALUES.get(previous, 0)
+    return "improving" if trend > 3 else "declining" if trend < -3 else "stable"
+
+
+class UserProfileStore:
+    """Per-user recommendation inputs kept up to date event by event.
+
+    Mood events add to an exponentially decayed mood distribution (weights
+    halve every ``mood_half_life`` seconds); watch events update genre
+    counts and completions over the latest ``watch_window`` items, replacing
+    an earlier event for the same content. Every write also stores the
+    ``mood_summary``/``watch_summary`` shaped result, so ``get`` is a single
+    primary-key read. Profiles live in SQLite and writes run in immediate
+    transactions, so workers sharing the file see each other's updates.
+
+    Profiles without events for ``max_age`` seconds count as missing (and
+    can be seeded again), in case the event feed stops. So do profiles
+    that events created before any history was seeded: they keep their
+    latest ``max_pending`` events and replay them on top of the history
+    once ``seed`` runs.
+    """
+
+    def __init__(self, path, mood_half_life=3 * 24 * 3600, watch_window=10,
+                 mood_window=10, max_age=24 * 3600, max_pending=1000,
+                 table="user_profiles"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid profile table name: {table}")
+        self.mood_half_life = mood_half_life
+        self.watch_window = watch_window
+        self.mood_window = mood_window
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.events = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " user_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " seeded INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in self._db.execute(
+            f"PRAGMA table_info({table})")]
+        if "seeded" not in columns:
+            # Databases created before unseeded profiles
+            self._db.execute(
+                f"ALTER TABLE {table} ADD COLUMN seeded INTEGER NOT NULL DEFAULT 1")
+
+    @staticmethod
+    def _new_state():
+        return {
+            "mood": {"weights": {}, "time": None, "recent": []},
+            "watch": {"recent": [], "genres": {}, "completed": 0},
+        }
+
+    def _add_mood(self, state, emotion, at):
+        mood = state["mood"]
+        weights = mood["weights"]
+        if mood["time"] is None or at >= mood["time"]:
+            if mood["time"] is not None:
+                decay = 0.5 ** ((at - mood["time"]) / self.mood_half_life)
+                for name in list(weights):
+                    weights[name] *= decay
+                    # Negligible next to a fresh event's weight of 1
+                    if weights[name] < 1e-6:
+                        del weights[name]
+            mood["time"] = at
+            weight = 1.0
+        else:
+            # Arrived late: weigh it as if decayed until the latest event
+            weight = 0.5 ** ((mood["time"] - at) / self.mood_half_life)
+        weights[emotion] = weights.get(emotion, 0.0) + weight
+
+        recent = mood["recent"]
+        bisect.insort(recent, [at, emotion])
+        del recent[:-self.mood_window]
+
+    def _add_watch(self, state, item, replace=True):
+        watch = state["watch"]
+        recent = watch["recent"]
+        if replace:
+            for index in reversed(range(len(recent))):
+                if recent[index]["id"] == item["id"]:
+                    self._drop_watch(watch, index)
+
+        # Newest first
+        index = 0
+        while index < len(recent) and recent[index]["at"] > item["at"]:
+            index += 1
+        if index >= self.watch_window:
+            return
+        recent.insert(index, item)
+        for genre in item["genre"]:
+            watch["genres"][genre] = watch["genres"].get(genre, 0) + 1
+        watch["completed"] += bool(item["completed"])
+        while len(recent) > self.watch_window:
+            self._drop_watch(watch, len(recent) - 1)
+
+    @staticmethod
+    def _drop_watch(watch, index):
+        item = watch["recent"].pop(index)
+        for genre in item["genre"]:
+            watch["genres"][genre] -= 1
+            if not watch["genres"][genre]:
+                del watch["genres"][genre]
+        watch["completed"] -= bool(item["completed"])
+
+    @staticmethod
+    def _summary(state):
+        summary = {"mood": None, "watch": None}
+
+        weights = state["mood"]["weights"]
+        total = sum(weights.values())
+        if total:
+            summary["mood"] = {
+                "dominant": max(weights, key=weights.get),
+                # Percentages, like the Express side's distribution
+                "distribution": {name: round(100 * weight / total, 1)
+                                 for name, weight in weights.items()},
+                "trend": mood_trend(
+                    [emotion for _, emotion in state["mood"]["recent"]]),
+            }
+
+        watch = state["watch"]
+        if watch["recent"]:
+            # Ties go to the genre seen most recently, as in watch_summary
+            seen = {}
+            for item in watch["recent"]:
+                for genre in item["genre"]:
+                    seen.setdefault(genre, len(seen))
+            summary["watch"] = {
+                "genres": sorted(watch["genres"].items(),
+                                 key=lambda x: (-x[1], seen[x[0]]))[:5],
+                "completed": watch["completed"],
+                "total": len(watch["recent"]),
+                "last_title": watch["recent"][0]["title"] or "Unknown",
+            }
+        return summary
+
+    def _watch_item(self, content_id, title, genre, completed, at):
+        return {"id": content_id or title, "title": title,
+                "genre": [str(g) for g in genre or []],
+                "completed": bool(completed), "at": at}
+
+    def _apply(self, state, event):
+        at = to_timestamp(event.get("timestamp"))
+        if event["type"] == "mood":
+            self._add_mood(state, event["emotion"], at)
+        else:
+            self._add_watch(state, self._watch_item(
+                event.get("content_id"), event.get("title"),
+                event.get("genre"), event.get("completed"), at))
+
+    def _write(self, statements):
+        """Run ``statements(cursor)`` in one immediate transaction"""
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    def _expired(self, updated):
+        return bool(self.max_age) and updated < time.time() - self.max_age
+
+    def _load(self, cursor, user_id):
+        """The user's state, or None if there is none or it expired"""
+        row = cursor.execute(
+            f"SELECT state, updated FROM {self.table} WHERE user_id = ?",
+            (user_id,)).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        return json.loads(row[0])
+
+    def _save(self, cursor, user_id, state):
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {self.table}"
+            " (user_id, state, summary, updated, seeded) VALUES (?, ?, ?, ?, ?)",
+            (user_id, json.dumps(state), json.dumps(self._summary(state)),
+             time.time(), "pending" not in state))
+
+    def ingest(self, events):
+        """Apply watch/mood event dicts; returns the number of users updated.
+
+        Watch events carry ``content_id``, ``title``, ``genre`` and
+        ``completed``, mood events an ``emotion``; both have ``user_id``,
+        ``type`` and an optional ``timestamp``.
+        """
+        by_user = {}
+        for event in events:
+            # Fixed now, in case the event is replayed later
+            event = dict(event, timestamp=to_timestamp(event.get("timestamp")))
+            by_user.setdefault(event["user_id"], []).append(event)
+
+        def statements(cursor):
+            for user_id, user_events in by_user.items():
+                state = self._load(cursor, user_id)
+                if state is None:
+                    # Not seeded yet, or seeded too long ago to trust: keep
+                    # the events for seed to replay
+                    state = self._new_state()
+                    state["pending"] = []
+                for event in user_events:
+                    self._apply(state, event)
+                if "pending" in state:
+                    state["pending"].extend(user_events)
+                    del state["pending"][:-self.max_pending]
+                self._save(cursor, user_id, state)
+
+        self._write(statements)
+        self.events += len(events)
+        return len(by_user)
+
+    def seed(self, user_id, mood_data, watch_data):
+        """Start a profile from the Express mood and watch history.
+
+        Does nothing if the user already has a current seeded profile, since
+        events ingested since then are newer than anything fetched. Events
+        an unseeded profile kept are replayed on top of the history.
+        """
+        state = self._new_state()
+        mood_data = mood_data or {}
+        seeded_moods = set()
+        for mood in mood_data.get("moods") or []:
+            if mood.get("emotion"):
+                at = to_timestamp(mood.get("timestamp"))
+                self._add_mood(state, mood["emotion"], at)
+                seeded_moods.add((at, mood["emotion"]))
+        if not state["mood"]["weights"]:
+            # No individual moods; start from the aggregate distribution
+            distribution = (mood_data.get("aggregatedData") or {}).get(
+                "moodDistribution") or {}
+            for name, weight in distribution.items():
+                if isinstance(weight, (int, float)) and weight > 0:
+                    state["mood"]["weights"][name] = float(weight)
+            if state["mood"]["weights"]:
+                state["mood"]["time"] = time.time()
+        now = time.time()
+        history = (watch_data or {}).get("watchHistory") or []
+        for index, item in enumerate(history):
+            # The history is newest first; keep that order without dates
+            at = to_timestamp(item["watchedAt"]) if item.get("watchedAt") \
+                else now - index
+            # Every history item counts, as in watch_summary, even when
+            # the same content appears twice
+            self._add_watch(state, self._watch_item(
+                item.get("contentId"), item.get("title"), item.get("genre"),
+                item.get("completed"), at), replace=False)
+
+        def statements(cursor):
+            row = cursor.execute(
+                f"SELECT state, updated, seeded FROM {self.table}"
+                " WHERE user_id = ?", (user_id,)).fetchone()
+            if row is not None and row[2] and not self._expired(row[1]):
+                return
+            if row is not None and not row[2]:
+                for event in json.loads(row[0])["pending"]:
+                    # The history may already hold the mood the event reported
+                    if event["type"] == "mood" and (
+                            to_timestamp(event.get("timestamp")),
+                            event["emotion"]) in seeded_moods:
+                        continue
+                    self._apply(state, event)
+            self._save(cursor, user_id, state)
+
+        self._write(statements)
+
+    def get(self, user_id):
+        """``{"mood": ..., "watch": ...}`` summaries, or None for unknown,
+        unseeded or expired profiles"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT summary, updated, seeded FROM {self.table}"
+                " WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or not row[2] or self._expired(row[1]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute(
+                f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "events": self.events}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,62 @@
+import torch
+import torch.nn.functional as F
+
+
+def trim_silence(waveform, sample_rate, frame_ms=20, silence_db=-50.0,
+                 dynamic_range_db=35.0, min_gap_ms=300, pad_ms=100,
+                 min_speech_ms=250):
+    """Energy-based voice activity trimming for a 1-D waveform.
+
+    A frame counts as voiced when its RMS level is above ``silence_db``
+    (dBFS) and within ``dynamic_range_db`` of the loudest frame. Pauses
+    shorter than ``min_gap_ms`` are kept so speech rhythm survives, longer
+    silent stretches (including leading/trailing silence) are dropped, and
+    ``pad_ms`` of context is kept around each voiced region.
+
+    Returns ``(trimmed, stats)``. ``trimmed`` is None when less than
+    ``min_speech_ms`` of speech is left, i.e. the clip is effectively silent.
+    """
+    num_samples = waveform.shape[-1]
+    if num_samples == 0:
+        return None, {"original_seconds": 0.0, "speech_seconds": 0.0,
+                      "removed_seconds": 0.0}
+
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    num_frames = -(-num_samples // frame)
+
+    # Frame RMS in dBFS, zero-padding the last partial frame
+    frames = F.pad(waveform.float(), (0, num_frames * frame - num_samples))
+    frames = frames.view(num_frames, frame)
+    level_db = 20 * torch.log10(frames.pow(2).mean(dim=1).sqrt() + 1e-10)
+    threshold = max(silence_db, level_db.max().item() - dynamic_range_db)
+    voiced = level_db > threshold
+
+    # Fill pauses between voiced frames that are too short to drop
+    max_gap = int(min_gap_ms / frame_ms)
+    voiced_idx = voiced.nonzero().squeeze(1)
+    if voiced_idx.numel() > 1:
+        gaps = voiced_idx[1:] - voiced_idx[:-1] - 1
+        for i in ((gaps > 0) & (gaps < max_gap)).nonzero().squeeze(1).tolist():
+            voiced[voiced_idx[i] + 1:voiced_idx[i + 1]] = True
+
+    # Keep some context around each voiced region
+    pad = int(pad_ms / frame_ms)
+    if pad > 0:
+        voiced = F.max_pool1d(
+            voiced.float().view(1, 1, -1), 2 * pad + 1, stride=1, padding=pad
+        ).view(-1) > 0
+
+    keep = voiced.repeat_interleave(frame)[:num_samples]
+    kept_samples = int(keep.sum().item())
+
+    stats = {
+        "original_seconds": round(num_samples / sample_rate, 2),
+        "speech_seconds": round(kept_samples / sample_rate, 2),
+        "removed_seconds": round((num_samples - kept_samples) / sample_rate, 2),
+    }
+
+    if kept_samples < sample_rate * min_speech_ms / 1000:
+        return None, stats
+    if kept_samples == num_samples:
+        return waveform, stats
+    return waveform[keep.to(waveform.device)], stats